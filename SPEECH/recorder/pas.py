@@ -1,11 +1,13 @@
 import requests
 import os
 import logging
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import numpy as np
 from pathlib import Path
-from pydub import AudioSegment
-import soundfile as sf
-import librosa
+
+from worker_client import MetadataUploader, UploadError, create_session, download_audio_files, fetch_all_pages, process_audio
 import json
 
 # Configure logging
@@ -17,6 +19,12 @@ SERVER_URL = "http://127.0.0.1:8000"  # Replace with your actual server URL
 GET_AUDIO_URL = f"{SERVER_URL}/api/audio_files/"  # Endpoint to fetch audio and text data
 POST_METADATA_URL = f"{SERVER_URL}/api/update_metadata/"  # Endpoint to upload processed metadata
 
+# Pipeline configuration
+ANALYZE_WORKERS = int(os.environ.get("ANALYZE_WORKERS", os.cpu_count() or 1))  # Analyzer processes
+QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 32))  # Items buffered between stages
+_DONE = object()  # End-of-stream marker passed between stages
+CHECKPOINT_FILE = os.environ.get("CHECKPOINT_FILE", "processed_audio/uploaded_ids.txt")  # Acknowledged ids
+
 def json_serialize(obj):
     """Custom JSON serializer to handle NumPy types."""
     if isinstance(obj, (np.integer, np.floating)):
@@ -25,87 +33,15 @@ def json_serialize(obj):
         return obj.tolist()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def fetch_audio_files():
-    """Fetch audio files along with their associated text prompt labels."""
+def fetch_audio_files(session, skip_ids=()):
+    """Fetch audio files along with their associated text prompt labels, page by page, skipping ids already uploaded."""
     try:
-        response = requests.get(GET_AUDIO_URL)
-        response.raise_for_status()
-        return response.json()  # Expected to return audio data with text prompt labels
+        # The endpoint is cursor-paginated; follow "next" until the last page
+        for audio in fetch_all_pages(session, GET_AUDIO_URL):
+            if audio['id'] not in skip_ids:
+                yield audio
     except requests.RequestException as e:
         logger.error(f"Error fetching audio files: {e}")
-        return []
-
-def download_audio_file(url, output_dir):
-    """Download audio file to the local system."""
-    try:
-        # Validate and construct full URL
-        if not url.startswith(("http://", "https://")):
-            url = f"{SERVER_URL}{url}" if not url.startswith("/") else f"{SERVER_URL}{url}"
-        
-        local_path = Path(output_dir) / os.path.basename(url)
-        
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        
-        logger.info(f"Downloaded file: {local_path}")
-        return local_path
-    except requests.RequestException as e:
-        logger.error(f"Failed to download file {url}: {e}")
-        return None
-
-def process_audio(file_path):
-    """Process the audio file to convert, trim, and extract metadata."""
-    try:
-        file_path = Path(file_path).resolve()
-        wav_path = convert_to_wav(file_path)
-        trimmed_path = trim_silence(wav_path)
-        metadata = extract_audio_metadata(trimmed_path)
-        return metadata
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
-        return {}
-
-def convert_to_wav(input_path):
-    """Convert audio file to WAV using Pydub."""
-    output_path = input_path.with_suffix(".wav")
-    if input_path.suffix.lower() != '.wav':
-        audio = AudioSegment.from_file(input_path)
-        audio.export(output_path, format="wav")
-    return output_path
-
-def trim_silence(wav_path):
-    """Trim silence from the start and end of a WAV file using librosa."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-        y_trimmed, _ = librosa.effects.trim(y, top_db=30)
-        trimmed_path = wav_path.with_name(wav_path.stem + '_trimmed.wav')
-        sf.write(trimmed_path, y_trimmed, sr)
-        return trimmed_path
-    except Exception as e:
-        logger.error(f"Error trimming silence from {wav_path}: {e}")
-        return wav_path
-
-def extract_audio_metadata(wav_path):
-    """Extract metadata from the WAV file."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-        duration = librosa.get_duration(y=y, sr=sr)
-        rms = float(librosa.feature.rms(y=y).mean())
-        clarity_score = min(max(rms / 0.1, 0), 1)
-        noise_level = float(librosa.feature.rms(y=y).mean())
-        
-        return {
-            "Duration (seconds)": round(duration, 2),
-            "RMS (Root Mean Square Energy)": round(rms, 4),
-            "Speech Clarity Score": round(clarity_score, 2),
-            "Background Noise Level": round(noise_level, 4),
-        }
-    except Exception as e:
-        logger.error(f"Error extracting metadata from {wav_path}: {e}")
-        return {}
 
 def save_audio_with_metadata(file_path, metadata, text_prompt, output_dir):
     """Save the audio file along with its metadata and text prompt label."""
@@ -132,49 +68,126 @@ def save_audio_with_metadata(file_path, metadata, text_prompt, output_dir):
         logger.error(f"Error saving audio or metadata: {e}")
         return None, None
 
-def upload_metadata(metadata_list):
-    """Upload metadata back to the server."""
+def analyze_clip(audio, file_path, output_dir):
+    """Analyzer stage (runs in the process pool): process one downloaded clip and save it."""
+    text_prompt = audio['text_prompt']  # Assuming text prompt is part of the response
+    metadata = process_audio(file_path)
+    if not metadata:
+        return None
+
+    # Save audio and its metadata
+    audio_path, metadata_path = save_audio_with_metadata(file_path, metadata, text_prompt, output_dir)
+    if not (audio_path and metadata_path):
+        return None
+    return {
+        "id": audio['id'],
+        "audio_file": str(audio_path),
+        "metadata_file": str(metadata_path),
+        "text_prompt": text_prompt,
+        "metadata": metadata
+    }
+
+def put_unless_stopped(q, item, stop):
+    """Put ``item`` on a bounded queue, giving up once ``stop`` is set; returns whether it was queued."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def download_stage(session, audio_files, output_dir, download_queue, stop):
+    """Download stage: feed finished downloads to the analyzers, blocking when they fall behind."""
     try:
-        response = requests.post(
-            POST_METADATA_URL, 
-            json=metadata_list,
-            headers={'Content-Type': 'application/json'}
-        )
-        response.raise_for_status()
-        logger.info("Metadata uploaded successfully.")
-    except requests.RequestException as e:
-        logger.error(f"Error uploading metadata: {e}")
-        logger.error(f"Metadata details: {metadata_list}")
+        for audio, file_path in download_audio_files(session, audio_files, output_dir, SERVER_URL):
+            if file_path and not put_unless_stopped(download_queue, (audio, file_path), stop):
+                break
+    finally:
+        put_unless_stopped(download_queue, _DONE, stop)
+
+def upload_stage(uploader, upload_queue, stop, failure):
+    """
+    Upload stage: post analyzed clips in batches as they complete.
+
+    If the uploader gives up, the error is kept in ``failure`` and ``stop`` is
+    set; the queue is still drained to the end, so no stage blocks on it.
+    """
+    item = None
+    try:
+        while (item := upload_queue.get()) is not _DONE:
+            uploader.add(item)
+        uploader.flush()
+    except UploadError as e:
+        logger.error(f"Stopping: {e}")
+        failure.append(e)
+        stop.set()
+        while item is not _DONE:
+            item = upload_queue.get()
 
 def main():
-    audio_files = fetch_audio_files()
-    if not audio_files:
-        logger.info("No unprocessed audio files found.")
-        return
-    
+    session = create_session()
     output_dir = "processed_audio"
     os.makedirs(output_dir, exist_ok=True)
-    
-    metadata_list = []
-    for audio in audio_files:
-        url = audio['audio_file']
-        text_prompt = audio['text_prompt']  # Assuming text prompt is part of the response
-        file_path = download_audio_file(url, output_dir)
-        if file_path:
-            metadata = process_audio(file_path)
-            if metadata:
-                # Save audio and its metadata
-                audio_path, metadata_path = save_audio_with_metadata(file_path, metadata, text_prompt, output_dir)
-                if audio_path and metadata_path:
-                    metadata_list.append({
-                        "audio_file": audio_path,
-                        "metadata_file": metadata_path,
-                        "text_prompt": text_prompt,
-                        "metadata": metadata
-                    })
-    
-    if metadata_list:
-        upload_metadata(metadata_list)
+
+    # Ids in the checkpoint were acknowledged by the server in an interrupted earlier run
+    metadata_uploader = MetadataUploader(session, POST_METADATA_URL, CHECKPOINT_FILE)
+    audio_files = fetch_audio_files(session, skip_ids=metadata_uploader.acknowledged)
+
+    # Bounded queues give backpressure: a slow stage stalls the one before it
+    download_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    upload_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()  # Set when the pipeline must wind down early
+    failure = []  # Error that made the upload stage give up
+    downloader = threading.Thread(target=download_stage, args=(session, audio_files, output_dir, download_queue, stop), daemon=True)
+    uploader = threading.Thread(target=upload_stage, args=(metadata_uploader, upload_queue, stop, failure))
+    downloader.start()
+    uploader.start()
+
+    pending = set()
+
+    def forward(futures):
+        for future in futures:
+            pending.discard(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing clip: {e}")
+                continue
+            if result:
+                upload_queue.put(result)
+
+    try:
+        with ProcessPoolExecutor(max_workers=ANALYZE_WORKERS) as pool:
+            while not stop.is_set():
+                try:
+                    item = download_queue.get(timeout=0.1)
+                except queue.Empty:
+                    item = None
+                if item is _DONE:
+                    break
+
+                # Hand finished analyses to the uploader; cap work queued in the pool
+                forward([future for future in pending if future.done()])
+                if item is not None:
+                    if len(pending) >= 2 * ANALYZE_WORKERS:
+                        forward(wait(pending, return_when=FIRST_COMPLETED).done)
+                    pending.add(pool.submit(analyze_clip, *item, output_dir))
+
+            if stop.is_set():
+                for future in pending:
+                    future.cancel()
+            else:
+                forward(wait(pending).done)
+    finally:
+        stop.set()  # Releases the downloader if it is blocked on a full queue
+        upload_queue.put(_DONE)
+        uploader.join()
+
+    if failure:
+        raise failure[0]
+    # The run is complete: upload the last batch and retire the checkpoint
+    metadata_uploader.close()
 
 if __name__ == "__main__":
     main()
@@ -2,10 +2,8 @@ import requests
 import os
 import logging
 import numpy as np
-from pathlib import Path
-from pydub import AudioSegment
-import soundfile as sf
-import librosa
+
+from worker_client import MetadataUploader, create_session, download_audio_files, fetch_all_pages, process_audio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,6 +13,7 @@ logger = logging.getLogger(__name__)
 SERVER_URL = "http://127.0.0.1:8000"  # Replace with your actual server URL
 GET_AUDIO_URL = f"{SERVER_URL}/api/audio_files/"
 POST_METADATA_URL = f"{SERVER_URL}/api/update_metadata/"
+CHECKPOINT_FILE = os.environ.get("CHECKPOINT_FILE", "downloaded_audio/uploaded_ids.txt")  # Acknowledged ids
 
 def json_serialize(obj):
     """
@@ -32,127 +31,42 @@ def json_serialize(obj):
         return obj.tolist()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def fetch_audio_files():
-    """Fetch unprocessed audio files from the server."""
+def fetch_audio_files(session, skip_ids=()):
+    """Fetch unprocessed audio files from the server, page by page, skipping ids already uploaded."""
     try:
-        response = requests.get(GET_AUDIO_URL)
-        response.raise_for_status()
-        return response.json()
+        # The endpoint is cursor-paginated; follow "next" until the last page
+        for audio in fetch_all_pages(session, GET_AUDIO_URL):
+            if audio['id'] not in skip_ids:
+                yield audio
     except requests.RequestException as e:
         logger.error(f"Error fetching audio files: {e}")
-        return []
-
-def download_audio_file(url, output_dir):
-    """Download audio file to the local system."""
-    try:
-        # Validate and construct full URL
-        if not url.startswith(("http://", "https://")):
-            url = f"{SERVER_URL}{url}" if not url.startswith("/") else f"{SERVER_URL}{url}"
-        
-        local_path = Path(output_dir) / os.path.basename(url)
-        
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        
-        logger.info(f"Downloaded file: {local_path}")
-        return local_path
-    except requests.RequestException as e:
-        logger.error(f"Failed to download file {url}: {e}")
-        return None
-
-def process_audio(file_path):
-    """Process the audio file to convert, trim, and extract metadata."""
-    try:
-        file_path = Path(file_path).resolve()
-        wav_path = convert_to_wav(file_path)
-        trimmed_path = trim_silence(wav_path)
-        metadata = extract_audio_metadata(trimmed_path)
-        return metadata
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
-        return {}
-
-def convert_to_wav(input_path):
-    """Convert audio file to WAV using Pydub."""
-    output_path = input_path.with_suffix(".wav")
-    if input_path.suffix.lower() != '.wav':
-        audio = AudioSegment.from_file(input_path)
-        audio.export(output_path, format="wav")
-    return output_path
-
-def trim_silence(wav_path):
-    """Trim silence from the start and end of a WAV file using librosa."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-        y_trimmed, _ = librosa.effects.trim(y, top_db=30)
-        trimmed_path = wav_path.with_name(wav_path.stem + '_trimmed.wav')
-        sf.write(trimmed_path, y_trimmed, sr)
-        return trimmed_path
-    except Exception as e:
-        logger.error(f"Error trimming silence from {wav_path}: {e}")
-        return wav_path
-
-def extract_audio_metadata(wav_path):
-    """Extract metadata from the WAV file."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-        duration = librosa.get_duration(y=y, sr=sr)
-        rms = float(librosa.feature.rms(y=y).mean())
-        clarity_score = min(max(rms / 0.1, 0), 1)
-        noise_level = float(librosa.feature.rms(y=y).mean())
-        
-        return {
-            "Duration (seconds)": round(duration, 2),
-            "RMS (Root Mean Square Energy)": round(rms, 4),
-            "Speech Clarity Score": round(clarity_score, 2),
-            "Background Noise Level": round(noise_level, 4),
-        }
-    except Exception as e:
-        logger.error(f"Error extracting metadata from {wav_path}: {e}")
-        return {}
-
-def upload_metadata(metadata_list):
-    """Upload metadata back to the server."""
-    try:
-        # Use custom JSON serializer to handle NumPy types
-        response = requests.post(
-            POST_METADATA_URL, 
-            json=metadata_list,
-            # Add custom JSON encoder to handle NumPy types
-            headers={'Content-Type': 'application/json'}
-        )
-        response.raise_for_status()
-        logger.info("Metadata uploaded successfully.")
-    except requests.RequestException as e:
-        logger.error(f"Error uploading metadata: {e}")
-        # Optional: print out the problematic metadata for debugging
-        logger.error(f"Metadata details: {metadata_list}")
 
 def main():
-    audio_files = fetch_audio_files()
-    if not audio_files:
-        logger.info("No unprocessed audio files found.")
-        return
-    
+    session = create_session()
     output_dir = "downloaded_audio"
     os.makedirs(output_dir, exist_ok=True)
-    
-    metadata_list = []
-    for audio in audio_files:
-        url = audio['audio_file']
-        file_path = download_audio_file(url, output_dir)
+
+    # Results are posted in batches; ids in the checkpoint were acknowledged in an interrupted earlier run
+    uploader = MetadataUploader(session, POST_METADATA_URL, CHECKPOINT_FILE)
+    audio_files = fetch_audio_files(session, skip_ids=uploader.acknowledged)
+
+    processed = 0
+    # Downloads run concurrently; each clip is processed as soon as it lands
+    for audio, file_path in download_audio_files(session, audio_files, output_dir, SERVER_URL):
         if file_path:
             metadata = process_audio(file_path)
-            metadata_list.append({
-                "id": audio['id'],
-                "metadata": metadata
-            })
-    
-    if metadata_list:
-        upload_metadata(metadata_list)
+            # Failed analysis returns {}; posting it would mark the row processed with no scores
+            if metadata:
+                uploader.add({
+                    "id": audio['id'],
+                    "metadata": metadata
+                })
+                processed += 1
+
+    # The run is complete: upload the last batch and retire the checkpoint
+    uploader.close()
+    if not processed:
+        logger.info("No unprocessed audio files found.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,7 +2,8 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import TextPrompt,AudioFile
+from .models import TextPrompt,AudioFile,UploadSession
 
 admin.site.register(TextPrompt)
-admin.site.register(AudioFile)
\ No newline at end of file
+admin.site.register(AudioFile)
+admin.site.register(UploadSession)
\ No newline at end of file
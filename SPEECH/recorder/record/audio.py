@@ -0,0 +1,236 @@
+"""
+In-memory audio analysis pipeline.
+
+Each upload is decoded exactly once (ffmpeg piped straight into a NumPy
+buffer); silence trimming and metadata extraction run on that same array,
+so no intermediate WAV files are written to disk. Clip-level features come
+from the vectorized extractor in ``record.features``; when the checksum of a
+file is known, its RMS envelope is kept in the feature cache so later
+passes can re-score it without decoding.
+
+Recordings longer than AUDIO_STREAMING_MAX_SECONDS are never held in memory:
+decoding switches to fixed-size blocks that are reduced to per-hop energies
+as they arrive, and trimming and features are computed from those.
+
+Every clip is analyzed at one rate, AUDIO_ANALYSIS_SAMPLE_RATE (16 kHz by
+default, all an ASR corpus needs). ffmpeg's polyphase resampler converts
+to it inside the decode, so the signal is resampled exactly once and every
+later stage works on the smaller array.
+"""
+import logging
+import subprocess
+import tempfile
+
+import librosa
+import numpy as np
+
+from django.conf import settings
+
+from . import metrics
+from .feature_cache import get_feature_cache
+from .features import BlockEnergy, extract_features, features_from_envelope, streamed_features
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_SAMPLE_RATE = 16000  # Default for AUDIO_ANALYSIS_SAMPLE_RATE
+TRIM_TOP_DB = 30  # Adjust top_db as needed
+STREAM_BLOCK_SAMPLES = 1 << 16  # Samples read from ffmpeg per block
+
+
+def analysis_sample_rate():
+    return getattr(settings, 'AUDIO_ANALYSIS_SAMPLE_RATE', ANALYSIS_SAMPLE_RATE)
+
+
+def _ffmpeg_decode_command(path, sr):
+    return [
+        'ffmpeg',
+        '-nostdin',
+        '-v', 'error',
+        '-i', str(path),  # Convert Path to string
+        '-f', 'f32le',
+        '-acodec', 'pcm_f32le',
+        '-ar', str(sr),
+        '-ac', '1',
+        'pipe:1'
+    ]
+
+
+def decode_audio(path, sr=None):
+    """Decode any input audio format to a mono float32 array at ``sr`` (default: the analysis rate)."""
+    sr = sr or analysis_sample_rate()
+    try:
+        result = subprocess.run(
+            _ffmpeg_decode_command(path, sr), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    except subprocess.CalledProcessError as e:
+        error_message = e.stderr.decode() if e.stderr else str(e)
+        logger.error(f"FFmpeg decode error for {path}: {error_message}")
+        raise
+
+    return np.frombuffer(result.stdout, dtype=np.float32), sr
+
+
+def decode_bounded(path, sr=None, max_samples=None):
+    """
+    Decode in fixed-size blocks, keeping at most ``max_samples`` in memory.
+
+    Returns ``(y, None)`` when the whole signal fits, otherwise
+    ``(None, energies)`` with a ``BlockEnergy`` accumulated over the stream.
+    """
+    sr = sr or analysis_sample_rate()
+    blocks, buffered, energies = [], 0, None
+    # stderr goes to a file, not a pipe: a damaged input can log more than a
+    # pipe buffer holds, and ffmpeg would then block while stdout is being read
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(_ffmpeg_decode_command(path, sr), stdout=subprocess.PIPE, stderr=stderr_file)
+    try:
+        while data := process.stdout.read(STREAM_BLOCK_SAMPLES * 4):
+            # The buffered pipe returns whole blocks until EOF, so reads stay float-aligned
+            block = np.frombuffer(data, dtype=np.float32)
+            if energies is not None:
+                energies.update(block)
+                continue
+            blocks.append(block)
+            buffered += len(block)
+            if max_samples is not None and buffered > max_samples:
+                # Too long to hold: fold what was buffered into block energies
+                energies = BlockEnergy()
+                for buffered_block in blocks:
+                    energies.update(buffered_block)
+                blocks = []
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+        stderr_file.close()
+
+    if process.returncode:
+        error_message = stderr.decode(errors="replace") or f"ffmpeg exited with {process.returncode}"
+        logger.error(f"FFmpeg decode error for {path}: {error_message}")
+        raise subprocess.CalledProcessError(process.returncode, 'ffmpeg', stderr=stderr)
+    if energies is not None:
+        return None, energies
+    return (np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)), None
+
+
+def trim_silence(y, top_db=TRIM_TOP_DB):
+    """Trim silence from the start and end of a decoded signal."""
+    y_trimmed, _ = librosa.effects.trim(y, top_db=top_db)
+    return y_trimmed
+
+
+def _metadata_row(table, index):
+    return {
+        'duration': round(float(table['duration'][index]), 2),
+        'rms': round(float(table['rms'][index]), 4),
+        'speech_clarity_score': round(float(table['clarity'][index]), 2),
+        'background_noise_level': round(float(table['noise_floor'][index]), 4),
+    }
+
+
+def extract_audio_metadata(y, sr):
+    """Extract duration, RMS, clarity and noise floor from a decoded signal."""
+    if y.size == 0:
+        raise ValueError("Audio contains no samples after trimming.")
+    return _metadata_row(extract_features([y], sr), 0)
+
+
+def cached_metadata(checksum):
+    """Rebuild metadata from the feature cache, or return None on a miss."""
+    cache = get_feature_cache()
+    if cache is None or not checksum:
+        return None
+    envelope = cache.get(checksum, 'rms')
+    info = cache.get(checksum, 'info')
+    if envelope is None or info is None:
+        return None
+    n_samples, sr = int(info[0]), int(info[1])
+    if sr != analysis_sample_rate():
+        # Frames span a different duration at another rate; rescore from the audio
+        return None
+    return _metadata_row(features_from_envelope(envelope, n_samples, sr), 0)
+
+
+def _cache_features(checksum, n_samples, sr, envelope, y=None):
+    cache = get_feature_cache()
+    if cache is None or not checksum:
+        return
+    cache.put(checksum, 'rms', envelope)
+    cache.put(checksum, 'info', np.array([n_samples, sr], dtype=np.int64))
+    # Streamed recordings have no signal in memory to build a spectrogram from
+    if y is not None and getattr(settings, 'AUDIO_FEATURE_CACHE_LOGMEL', False):
+        mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=80)
+        cache.put(checksum, 'logmel', librosa.power_to_db(mel).astype(np.float16))
+
+
+def analyze_audio(path, checksum=None):
+    """Decode, trim and extract metadata for one audio file in a single pass."""
+    metadata, error = analyze_audio_batch([path], [checksum])[0]
+    if error:
+        raise Exception(error)
+    return metadata
+
+
+def _analyze_streamed(energies, sr, checksum):
+    """Trim and score a long recording from its block energies."""
+    table, envelope, n_samples = streamed_features(energies.energies(), energies.n_samples, sr, TRIM_TOP_DB)
+    if n_samples == 0:
+        raise ValueError("Audio contains no samples after trimming.")
+    try:
+        _cache_features(checksum, n_samples, sr, envelope)
+    except OSError as e:
+        logger.error(f"Error caching streamed features: {str(e)}")
+    return _metadata_row(table, 0)
+
+
+def analyze_audio_batch(paths, checksums=None):
+    """
+    Analyze many files, extracting features for all of them in one vectorized pass.
+
+    Files whose checksum is in the feature cache are scored from the cached
+    envelope without being decoded, and files longer than
+    AUDIO_STREAMING_MAX_SECONDS are scored block by block. Returns a list of ``(metadata, error)``
+    pairs in input order.
+    """
+    checksums = checksums or [None] * len(paths)
+    outcomes = [None] * len(paths)
+    clips, indices = [], []
+    sr = analysis_sample_rate()
+    max_seconds = getattr(settings, 'AUDIO_STREAMING_MAX_SECONDS', None)
+    max_samples = int(max_seconds * sr) if max_seconds else None
+    for index, (path, checksum) in enumerate(zip(paths, checksums)):
+        try:
+            with metrics.stage('cache_lookup'):
+                metadata = cached_metadata(checksum)
+            if metadata is not None:
+                outcomes[index] = (metadata, None)
+                continue
+
+            with metrics.stage('decode'):
+                y, energies = decode_bounded(path, sr, max_samples)
+            if energies is not None:
+                with metrics.stage('stream_features'):
+                    outcomes[index] = (_analyze_streamed(energies, sr, checksum), None)
+                continue
+            with metrics.stage('trim'):
+                y = trim_silence(y)
+            if y.size == 0:
+                raise ValueError("Audio contains no samples after trimming.")
+            clips.append(y)
+            indices.append(index)
+        except Exception as e:
+            outcomes[index] = (None, f"Error analyzing {path}: {str(e)}")
+
+    if clips:
+        with metrics.stage('features'):
+            table = extract_features(clips, sr, return_envelopes=True)
+        for row, index in enumerate(indices):
+            outcomes[index] = (_metadata_row(table, row), None)
+            try:
+                with metrics.stage('cache_store'):
+                    _cache_features(checksums[index], len(clips[row]), sr, table['envelopes'][row], clips[row])
+            except OSError as e:
+                logger.error(f"Error caching features for {paths[index]}: {str(e)}")
+    return outcomes
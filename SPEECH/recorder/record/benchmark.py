@@ -0,0 +1,180 @@
+"""
+Micro-benchmarks for the audio analysis pipeline on synthetic corpora.
+
+Clips are generated deterministically from a seed: a voiced harmonic signal
+with a wandering pitch and syllable-rate amplitude envelope, padded with
+silence and mixed with white noise at a chosen SNR. Each stage of the hot
+path is timed separately over the same clips, blocks of clips are processed
+one at a time so 10k-clip runs fit in memory, and results can be saved as a
+baseline and compared against later runs.
+"""
+import json
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from .audio import analyze_audio, analyze_audio_batch, decode_audio, extract_audio_metadata, trim_silence
+from .features import extract_features
+
+SAMPLE_RATES = (16000, 22050, 44100, 48000)
+SNR_DB = (30, 20, 10)
+STAGES = ('decode', 'trim', 'extract', 'extract_batch', 'pipeline_batch', 'pipeline_per_file')
+
+
+def synthesize_clip(rng, duration, sr, snr_db):
+    """A speech-like clip: voiced syllables between silent margins, plus noise."""
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+
+    # Pitch wanders between ~90 and ~250 Hz; harmonics fall off like a voice
+    f0 = rng.uniform(110, 200) + 40 * np.sin(2 * np.pi * rng.uniform(0.2, 0.8) * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 9))
+
+    # ~4 syllables per second, each a smooth on/off burst
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, np.pi)), 0, None) ** 2
+    speech = 0.3 * voiced * syllables / np.max(np.abs(voiced))
+
+    # Silent margins exercise trim_silence
+    margin = int(rng.uniform(0.1, 0.5) * sr)
+    speech[:margin] = 0
+    speech[n - margin:] = 0
+
+    signal_power = np.mean(speech ** 2) or 1e-12
+    noise = rng.normal(0, np.sqrt(signal_power / 10 ** (snr_db / 10)), n)
+    return (speech + noise).astype(np.float32)
+
+
+def generate_corpus(directory, count, seed=0, min_duration=1.0, max_duration=8.0):
+    """Write ``count`` synthetic WAV clips; returns their paths and total audio seconds."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    total_seconds = 0.0
+    for index in range(count):
+        duration = rng.uniform(min_duration, max_duration)
+        sr = int(rng.choice(SAMPLE_RATES))
+        clip = synthesize_clip(rng, duration, sr, int(rng.choice(SNR_DB)))
+        path = Path(directory) / f"clip_{index:06d}.wav"
+        sf.write(path, clip, sr, subtype='PCM_16')
+        paths.append(path)
+        total_seconds += duration
+    return paths, total_seconds
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (ffmpeg) children, in MB."""
+    divisor = 1024 * 1024 if platform.system() == 'Darwin' else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return round(own, 1), round(children, 1)
+
+
+class _Timer:
+    def __init__(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+
+    def run(self, stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.seconds[stage] += time.perf_counter() - started
+        return result
+
+
+def _run_block(timer, paths):
+    decoded = [timer.run('decode', decode_audio, path) for path in paths]
+    trimmed = [timer.run('trim', trim_silence, y) for y, _ in decoded]
+    sr = decoded[0][1]
+    for y in trimmed:
+        timer.run('extract', extract_audio_metadata, y, sr)
+    timer.run('extract_batch', extract_features, trimmed, sr)
+    # The full pipeline, as process_batch and process_audio_file run it
+    # (no checksums, so the feature cache is bypassed)
+    timer.run('pipeline_batch', analyze_audio_batch, paths)
+    for path in paths:
+        timer.run('pipeline_per_file', analyze_audio, path)
+
+
+def run_benchmark(clips=1000, block_size=200, seed=0, min_duration=1.0, max_duration=8.0):
+    """
+    Time every stage over ``clips`` synthetic clips and return a result dict.
+
+    Each stage reports seconds, clips per second and a realtime factor
+    (seconds of audio processed per second).
+    """
+    timer = _Timer()
+    total_audio = 0.0
+    synth_seconds = 0.0
+    workdir = Path(tempfile.mkdtemp(prefix='audio_bench_'))
+    try:
+        for start in range(0, clips, block_size):
+            count = min(block_size, clips - start)
+            block_dir = workdir / str(start)
+            block_dir.mkdir()
+            started = time.perf_counter()
+            paths, seconds = generate_corpus(block_dir, count, seed + start, min_duration, max_duration)
+            synth_seconds += time.perf_counter() - started
+            total_audio += seconds
+            _run_block(timer, paths)
+            shutil.rmtree(block_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    own_rss, child_rss = peak_rss_mb()
+    return {
+        'clips': clips,
+        'audio_seconds': round(total_audio, 1),
+        'synthesis_seconds': round(synth_seconds, 3),
+        'peak_rss_mb': own_rss,
+        'peak_child_rss_mb': child_rss,
+        'stages': {
+            stage: {
+                'seconds': round(seconds, 3),
+                'clips_per_second': round(clips / seconds, 2) if seconds else None,
+                'realtime_factor': round(total_audio / seconds, 1) if seconds else None,
+            }
+            for stage, seconds in timer.seconds.items()
+        },
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    """Store results keyed by clip count, keeping baselines for other sizes."""
+    path = Path(path)
+    baselines = load_baseline(path) if path.exists() else {}
+    baselines[str(results['clips'])] = results
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(results, baselines, tolerance=0.2):
+    """
+    Return a list of regressions against the baseline for the same clip count.
+
+    A stage regresses when its throughput falls more than ``tolerance``
+    (a fraction) below the baseline.
+    """
+    baseline = baselines.get(str(results['clips']))
+    if baseline is None:
+        raise KeyError(f"No baseline for {results['clips']} clips")
+
+    regressions = []
+    for stage, current in results['stages'].items():
+        reference = baseline['stages'].get(stage, {}).get('clips_per_second')
+        if reference and current['clips_per_second'] is not None:
+            if current['clips_per_second'] < reference * (1 - tolerance):
+                regressions.append(
+                    f"{stage}: {current['clips_per_second']} clips/s vs baseline {reference} clips/s"
+                )
+    return regressions
@@ -0,0 +1,99 @@
+"""
+Persistent frame-level feature cache.
+
+Features are stored as ``.npy`` files under ``<root>/<key[:2]>/<key>/`` where
+``key`` is the audio content checksum, and are read back memory-mapped, so a
+re-scoring pass never decodes audio again. Entries are evicted least recently
+used first once the cache grows past its size limit.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EVICT_EVERY = 100  # Writes between size checks
+
+
+class FeatureCache:
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._writes = 0
+
+    def _entry(self, key):
+        return self.root / key[:2] / key
+
+    def get(self, key, name):
+        """
+        Return a read-only memory-mapped array, or None on a miss.
+
+        Any I/O error counts as a miss: another process may evict the entry
+        between the load and the access-time update.
+        """
+        path = self._entry(key) / f"{name}.npy"
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path.parent)  # Mark the entry as recently used
+        except (OSError, ValueError):
+            return None
+        return array
+
+    def put(self, key, name, array):
+        """Store ``array`` atomically under ``key``/``name``; a failed write is logged and skipped."""
+        entry = self._entry(key)
+        tmp_path = None
+        try:
+            entry.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, entry / f"{name}.npy")
+        except OSError as e:
+            # E.g. the entry was evicted concurrently, or the disk is full
+            logger.error(f"Could not cache {name} for {key}: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry in self.root.glob('*/*'):
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:  # Evicted by another process meanwhile
+                continue
+            total += size
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        return total
+
+
+_cache = None
+
+
+def get_feature_cache():
+    """Return the configured FeatureCache, or None when caching is disabled."""
+    global _cache
+    root = getattr(settings, 'AUDIO_FEATURE_CACHE_DIR', None)
+    if not root:
+        return None
+    if _cache is None or _cache.root != Path(root):
+        _cache = FeatureCache(root, getattr(settings, 'AUDIO_FEATURE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+    return _cache
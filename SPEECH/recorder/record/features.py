@@ -0,0 +1,201 @@
+"""
+Vectorized batch feature extraction for decoded clips.
+
+Framewise RMS for a whole batch is computed from one cumulative sum of squared
+samples, so the cost is a few passes over memory rather than one Python call
+(and two librosa.feature.rms calls) per clip. Frames match
+``librosa.feature.rms(center=True)``: each clip is zero-padded by half a frame
+on both sides.
+
+For recordings too long to hold in memory, ``BlockEnergy`` reduces a stream
+of sample blocks to one sum of squares per hop. Silence trimming and every
+clip-level feature can be recovered exactly from those sums, so memory grows
+with duration / HOP_LENGTH rather than with the samples themselves.
+
+This module only depends on NumPy so the standalone workers can import it.
+"""
+import numpy as np
+
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+CLARITY_REFERENCE_RMS = 0.1  # RMS that maps to a clarity score of 1
+NOISE_FLOOR_PERCENTILE = 10  # Quietest 10% of frames estimate the noise floor
+MAX_BLOCK_SAMPLES = 16 * 1024 * 1024  # Padded samples held in memory per block
+
+FEATURE_COLUMNS = ('duration', 'rms', 'clarity', 'noise_floor')
+
+
+def _as_ragged(clips, lengths=None):
+    """Accept a list of 1-D arrays, or a padded 2-D array plus valid lengths."""
+    if isinstance(clips, np.ndarray) and clips.ndim == 2:
+        if lengths is None:
+            lengths = np.full(len(clips), clips.shape[1])
+        return [row[:length] for row, length in zip(clips, lengths)]
+    return [np.asarray(clip) for clip in clips]
+
+
+def frame_rms_batch(clips, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Framewise RMS for a list of 1-D clips.
+
+    Returns ``(rms, valid)``: two ``(n_clips, max_frames)`` arrays holding
+    the RMS envelopes and a mask of the frames that belong to each clip.
+    """
+    lengths = np.array([len(clip) for clip in clips], dtype=np.int64)
+    n_frames = 1 + lengths // hop_length
+    max_frames = int(n_frames.max()) if len(clips) else 0
+    pad = frame_length // 2
+    width = (max_frames - 1) * hop_length + frame_length
+
+    # Column 0 stays zero so frame energy is a difference of two cumsum columns
+    energy = np.zeros((len(clips), width + 1), dtype=np.float64)
+    for row, clip in zip(energy, clips):
+        np.square(clip, out=row[1 + pad:1 + pad + len(clip)])
+    np.cumsum(energy, axis=1, out=energy)
+
+    starts = np.arange(max_frames) * hop_length
+    frame_energy = energy[:, starts + frame_length] - energy[:, starts]
+    rms = np.sqrt(np.maximum(frame_energy / frame_length, 0.0))
+    valid = np.arange(max_frames) < n_frames[:, None]
+    return rms, valid
+
+
+def summarize_rms(rms, valid, lengths, sr):
+    """Reduce masked RMS envelopes to one row of clip-level features per clip."""
+    n_valid = valid.sum(axis=1)
+    mean_rms = np.where(valid, rms, 0.0).sum(axis=1) / np.maximum(n_valid, 1)
+    noise_floor = np.nanpercentile(np.where(valid, rms, np.nan), NOISE_FLOOR_PERCENTILE, axis=1)
+    return {
+        'duration': np.asarray(lengths, dtype=np.float64) / sr,
+        'rms': mean_rms,
+        'clarity': np.clip(mean_rms / CLARITY_REFERENCE_RMS, 0.0, 1.0),
+        'noise_floor': noise_floor,
+    }
+
+
+def _blocks(order, lengths, frame_length):
+    """Group clip indices (sorted by length) so each padded block fits in memory."""
+    block = []
+    for index in order:
+        padded = int(lengths[index]) + frame_length
+        if block and padded * (len(block) + 1) > MAX_BLOCK_SAMPLES:
+            yield block
+            block = []
+        block.append(index)
+    if block:
+        yield block
+
+
+def extract_features(clips, sr, lengths=None, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+                     return_envelopes=False):
+    """
+    Compute duration, mean RMS, clarity and noise floor for many clips.
+
+    ``clips`` is a list of 1-D arrays (ragged) or a padded 2-D array with
+    ``lengths`` giving each row's valid sample count. Returns a feature table:
+    a dict mapping each name in FEATURE_COLUMNS to an array with one value
+    per clip, in input order. With ``return_envelopes`` the table also holds
+    ``'envelopes'``, a list of each clip's float32 RMS envelope.
+    """
+    clips = _as_ragged(clips, lengths)
+    lengths = np.array([len(clip) for clip in clips], dtype=np.int64)
+    table = {name: np.zeros(len(clips), dtype=np.float64) for name in FEATURE_COLUMNS}
+    envelopes = [None] * len(clips)
+
+    # Sorting by length keeps padding waste small within each block
+    order = np.argsort(lengths, kind='stable')
+    for block in _blocks(order, lengths, frame_length):
+        rms, valid = frame_rms_batch([clips[i] for i in block], frame_length, hop_length)
+        summary = summarize_rms(rms, valid, lengths[block], sr)
+        for name in FEATURE_COLUMNS:
+            table[name][block] = summary[name]
+        if return_envelopes:
+            for row, index in enumerate(block):
+                envelopes[index] = rms[row, valid[row]].astype(np.float32)
+
+    if return_envelopes:
+        table['envelopes'] = envelopes
+    return table
+
+
+def features_from_envelope(envelope, n_samples, sr):
+    """Rebuild a one-row feature table from a stored RMS envelope."""
+    envelope = np.asarray(envelope, dtype=np.float64)[None, :]
+    return summarize_rms(envelope, np.ones(envelope.shape, dtype=bool), [n_samples], sr)
+
+
+class BlockEnergy:
+    """Accumulate per-hop sums of squared samples from a stream of blocks."""
+    def __init__(self, hop_length=HOP_LENGTH):
+        self.hop_length = hop_length
+        self.n_samples = 0
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._parts = []
+
+    def update(self, samples):
+        self.n_samples += len(samples)
+        if self._carry.size:
+            samples = np.concatenate([self._carry, samples])
+        n_full = len(samples) // self.hop_length * self.hop_length
+        if n_full:
+            hops = samples[:n_full].reshape(-1, self.hop_length)
+            self._parts.append(np.square(hops, dtype=np.float64).sum(axis=1))
+        self._carry = samples[n_full:].copy()
+
+    def energies(self):
+        """Sum of squares of each hop-sized block (the last one may be partial)."""
+        parts = list(self._parts)
+        if self._carry.size:
+            parts.append(np.array([np.square(self._carry, dtype=np.float64).sum()]))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float64)
+
+
+def _rms_from_blocks(energies, n_samples, frame_length, hop_length):
+    """Centered framewise RMS of a signal given as per-hop block energies."""
+    if frame_length % (2 * hop_length):
+        raise ValueError("frame_length must be an even multiple of hop_length")
+    blocks_per_frame = frame_length // hop_length
+    n_frames = 1 + n_samples // hop_length
+    padded = np.concatenate([np.zeros(blocks_per_frame // 2), energies, np.zeros(blocks_per_frame)])
+    cumulative = np.concatenate([[0.0], np.cumsum(padded)])
+    starts = np.arange(n_frames)
+    frame_energy = cumulative[starts + blocks_per_frame] - cumulative[starts]
+    return np.sqrt(np.maximum(frame_energy / frame_length, 0.0))
+
+
+def trim_bounds(energies, n_samples, top_db, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Sample range ``(start, end)`` kept by ``librosa.effects.trim``.
+
+    Frames quieter than ``top_db`` below the loudest frame are silence;
+    both bounds fall on hop boundaries (or the end of the signal).
+    """
+    rms = _rms_from_blocks(energies, n_samples, frame_length, hop_length)
+    amin = 1e-10  # librosa's amin ** 2
+    db = 10 * np.log10(np.maximum(amin, rms ** 2)) - 10 * np.log10(max(amin, float(rms.max()) ** 2))
+    nonsilent = np.flatnonzero(db > -top_db)
+    if nonsilent.size == 0:
+        return 0, 0
+    return int(nonsilent[0] * hop_length), min(n_samples, int((nonsilent[-1] + 1) * hop_length))
+
+
+def streamed_features(energies, n_samples, sr, top_db, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Trim silence and extract features from block energies alone.
+
+    ``top_db=None`` skips trimming. Returns ``(table, envelope, trimmed_samples)``: a one-row feature table
+    identical to ``extract_features`` on the trimmed clip, its float32 RMS
+    envelope and the trimmed length.
+    """
+    if top_db is None:
+        start, end = 0, n_samples
+    else:
+        start, end = trim_bounds(energies, n_samples, top_db, frame_length, hop_length)
+    length = end - start
+    if length == 0:
+        return None, None, 0
+
+    # Trimmed bounds are hop-aligned, so the trimmed clip's blocks are a slice
+    first, last = start // hop_length, -(-end // hop_length)
+    envelope = _rms_from_blocks(energies[first:last], length, frame_length, hop_length)
+    return features_from_envelope(envelope, length, sr), envelope.astype(np.float32), length
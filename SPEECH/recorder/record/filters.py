@@ -0,0 +1,82 @@
+"""Query-string filters shared by the AudioFile list endpoints."""
+from .models import AudioFile
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+BOOLEAN_FILTERS = ('is_ml_processed', 'is_verified')
+CHOICE_FILTERS = {
+    'quality': AudioFile.QUALITY_CHOICES,
+    'accent': AudioFile.ACCENT_CHOICES,
+    'gender': AudioFile.GENDER_CHOICES,
+    'age_group': AudioFile.AGE_GROUP_CHOICES,
+}
+# ?min_<name>= / ?max_<name>= bounds on the ML metadata columns
+RANGE_FILTERS = {
+    'clarity': 'speech_clarity_score',
+    'noise': 'background_noise_level',
+    'duration': 'duration',
+}
+# ?sort= keys (prefix with '-' for descending)
+SORT_FIELDS = {
+    'uploaded': 'uploaded_at',
+    'clarity': 'speech_clarity_score',
+    'noise': 'background_noise_level',
+    'duration': 'duration',
+    'prompt': 'text_prompt__text',
+}
+
+
+def parse_bool(value):
+    """Parse a query-string boolean, raising ValueError on anything else."""
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean value: {value}")
+
+
+def filter_audio_files(queryset, params):
+    """
+    Apply boolean, choice and range filters from ``params`` to an AudioFile queryset.
+
+    Raises ValueError for malformed values or unknown choices.
+    """
+    filters = {}
+    for name in BOOLEAN_FILTERS:
+        if params.get(name):
+            filters[name] = parse_bool(params[name])
+
+    for name, choices in CHOICE_FILTERS.items():
+        value = params.get(name)
+        if value:
+            if value not in dict(choices):
+                raise ValueError(f"Invalid {name}: {value}")
+            filters[name] = value
+
+    for name, field in RANGE_FILTERS.items():
+        for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+            value = params.get(f'{bound}_{name}')
+            if value:
+                try:
+                    filters[f'{field}__{lookup}'] = float(value)
+                except ValueError:
+                    raise ValueError(f"Invalid {bound}_{name}: {value}")
+
+    return queryset.filter(**filters)
+
+
+def sort_audio_files(queryset, sort):
+    """
+    Order an AudioFile queryset by a whitelisted ``?sort=`` key.
+
+    The id is appended as a tie-breaker so pages never overlap. Raises
+    ValueError for unknown keys.
+    """
+    descending = sort.startswith('-')
+    field = SORT_FIELDS.get(sort.lstrip('-'))
+    if field is None:
+        raise ValueError(f"Invalid sort: {sort}")
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{field}', f'{prefix}id')
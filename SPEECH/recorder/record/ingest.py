@@ -0,0 +1,142 @@
+"""
+Canonical storage format for uploaded recordings.
+
+Browsers upload webm/ogg/wav in whatever rate and channel layout they
+recorded. At ingest every upload is transcoded, in a single ffmpeg run, to
+one canonical file: 16 kHz mono FLAC (lossless, roughly a sixth of 44.1 kHz
+stereo PCM), plus optionally a small Opus preview for playback. The model is
+repointed at the canonical file only after it has been written, and the
+original is deleted afterwards unless AUDIO_KEEP_ORIGINALS is set, so
+``audio_file`` always names a file that exists.
+
+The checksum stays the SHA-256 of the uploaded bytes, so duplicate uploads
+are still recognized however they are stored.
+"""
+import logging
+import os
+import subprocess
+
+import soundfile as sf
+from django.conf import settings
+
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+CANONICAL_SAMPLE_RATE = 16000
+CANONICAL_EXTENSION = '.flac'
+PREVIEW_EXTENSION = '.opus'
+PREVIEW_BITRATE = '24k'
+
+
+def _ffmpeg_transcode_command(source, canonical_path=None, preview_path=None):
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', str(source)]
+    if canonical_path is not None:
+        command += [
+            '-map', '0:a:0', '-ac', '1', '-ar', str(CANONICAL_SAMPLE_RATE),
+            '-c:a', 'flac', '-sample_fmt', 's16',
+            str(canonical_path),
+        ]
+    if preview_path is not None:
+        # Another output of the same decode; Opus runs natively at 48 kHz
+        command += [
+            '-map', '0:a:0', '-ac', '1',
+            '-c:a', 'libopus', '-b:a', PREVIEW_BITRATE, '-application', 'voip',
+            str(preview_path),
+        ]
+    return command
+
+
+def transcode(source, canonical_path=None, preview_path=None):
+    """Write the canonical FLAC and/or the Opus preview for ``source`` in one ffmpeg run."""
+    try:
+        subprocess.run(
+            _ffmpeg_transcode_command(source, canonical_path, preview_path),
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+    except subprocess.CalledProcessError as e:
+        error_message = e.stderr.decode() if e.stderr else str(e)
+        logger.error(f"FFmpeg transcode error for {source}: {error_message}")
+        # Never leave half-written outputs behind
+        for path in (canonical_path, preview_path):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        raise
+
+
+def is_canonical(path):
+    """Whether ``path`` is already a 16 kHz mono FLAC."""
+    if not str(path).lower().endswith(CANONICAL_EXTENSION):
+        return False
+    try:
+        info = sf.info(str(path))
+    except RuntimeError:  # Not readable by libsndfile
+        return False
+    return info.samplerate == CANONICAL_SAMPLE_RATE and info.channels == 1
+
+
+def canonicalize(audio_file, keep_original=None, preview=None):
+    """
+    Transcode an AudioFile's stored upload to the canonical format in place.
+
+    ``keep_original`` and ``preview`` default to the AUDIO_KEEP_ORIGINALS and
+    AUDIO_PREVIEWS settings. Returns True when anything was written, False
+    when the row was already canonical. Raises if ffmpeg fails, in which case
+    the row still points at the untouched original.
+    """
+    if keep_original is None:
+        keep_original = getattr(settings, 'AUDIO_KEEP_ORIGINALS', False)
+    if preview is None:
+        preview = getattr(settings, 'AUDIO_PREVIEWS', False)
+
+    storage = audio_file.audio_file.storage
+    original_name = audio_file.audio_file.name
+    if not storage.exists(original_name):
+        raise FileNotFoundError(f"{original_name} is missing from storage")
+    needs_canonical = not is_canonical(storage.path(original_name))
+    needs_preview = preview and not audio_file.preview_file
+    if not needs_canonical and not needs_preview:
+        return False
+
+    base = os.path.splitext(original_name)[0]
+    canonical_name = storage.get_available_name(base + CANONICAL_EXTENSION) if needs_canonical else None
+    preview_name = storage.get_available_name(base + PREVIEW_EXTENSION) if needs_preview else None
+    transcode(
+        storage.path(original_name),
+        storage.path(canonical_name) if canonical_name else None,
+        storage.path(preview_name) if preview_name else None,
+    )
+
+    # Repoint the row only once the new files exist
+    update_fields = []
+    if canonical_name:
+        audio_file.audio_file.name = canonical_name
+        update_fields.append('audio_file')
+        if keep_original:
+            audio_file.original_file.name = original_name
+            update_fields.append('original_file')
+    if preview_name:
+        audio_file.preview_file.name = preview_name
+        update_fields.append('preview_file')
+    audio_file.save(update_fields=update_fields)
+
+    if canonical_name and not keep_original:
+        storage.delete(original_name)
+    return True
+
+
+def ingest_upload(audio_file):
+    """
+    Canonicalize a freshly saved upload when AUDIO_CANONICALIZE is on.
+
+    A failed transcode is logged and the original is kept as the stored
+    file, so an upload is never lost to an ffmpeg error.
+    """
+    if not getattr(settings, 'AUDIO_CANONICALIZE', True):
+        return False
+    try:
+        with stage('transcode'):
+            return canonicalize(audio_file)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.error(f"Keeping {audio_file.audio_file.name} as uploaded: {str(e)}")
+        return False
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from record.benchmark import compare_to_baseline, load_baseline, run_benchmark, save_baseline
+
+
+class Command(BaseCommand):
+    help = 'Benchmark each audio analysis stage on a synthetic corpus and check it against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clips', type=int, action='append', help='Corpus size; repeat for several (default 1000)')
+        parser.add_argument('--block-size', type=int, default=200, help='Clips generated and held in memory at once')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--min-duration', type=float, default=1.0)
+        parser.add_argument('--max-duration', type=float, default=8.0)
+        parser.add_argument('--baseline', default='benchmarks/audio_baseline.json')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--compare', action='store_true', help='Fail if a stage regressed against the baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput drop (fraction)')
+
+    def handle(self, *args, **options):
+        regressions = []
+        for clips in options['clips'] or [1000]:
+            self.stdout.write(f"Benchmarking {clips} clips...")
+            results = run_benchmark(
+                clips=clips,
+                block_size=options['block_size'],
+                seed=options['seed'],
+                min_duration=options['min_duration'],
+                max_duration=options['max_duration'],
+            )
+            self._report(results)
+
+            if options['compare']:
+                try:
+                    regressions += compare_to_baseline(results, load_baseline(options['baseline']), options['tolerance'])
+                except (OSError, KeyError) as e:
+                    raise CommandError(f"Cannot compare to baseline: {e}")
+            if options['save_baseline']:
+                save_baseline(options['baseline'], results)
+                self.stdout.write(self.style.SUCCESS(f"Saved baseline for {clips} clips to {options['baseline']}"))
+
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+        if options['compare']:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{results['clips']} clips, {results['audio_seconds']} s of audio "
+            f"(synthesized in {results['synthesis_seconds']} s)"
+        )
+        self.stdout.write(f"{'stage':<20}{'seconds':>10}{'clips/s':>12}{'x realtime':>12}")
+        for stage, timing in results['stages'].items():
+            self.stdout.write(
+                f"{stage:<20}{timing['seconds']:>10}{timing['clips_per_second'] or '-':>12}"
+                f"{timing['realtime_factor'] or '-':>12}"
+            )
+        self.stdout.write(
+            f"Peak RSS: {results['peak_rss_mb']} MB (ffmpeg children: {results['peak_child_rss_mb']} MB)"
+        )
@@ -0,0 +1,47 @@
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from record.ingest import canonicalize
+from record.models import AudioFile
+
+
+class Command(BaseCommand):
+    help = 'Transcode stored recordings to the canonical 16 kHz mono FLAC format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-originals', action='store_true', default=None,
+            help='Keep each upload as received in original_file (default: AUDIO_KEEP_ORIGINALS)'
+        )
+        parser.add_argument(
+            '--previews', action='store_true', default=None,
+            help='Also write Opus previews (default: AUDIO_PREVIEWS)'
+        )
+
+    def handle(self, *args, **options):
+        keep_original = options['keep_originals']
+        if keep_original is None:
+            keep_original = settings.AUDIO_KEEP_ORIGINALS
+        preview = options['previews']
+        if preview is None:
+            preview = settings.AUDIO_PREVIEWS
+
+        converted = unchanged = 0
+        failed = []
+        queryset = AudioFile.objects.only('id', 'text_prompt_id', 'audio_file', 'original_file', 'preview_file')
+        for audio_file in queryset.order_by('id').iterator(chunk_size=500):
+            try:
+                if canonicalize(audio_file, keep_original=keep_original, preview=preview):
+                    converted += 1
+                else:
+                    unchanged += 1
+            except (subprocess.CalledProcessError, OSError) as e:
+                failed.append(audio_file.pk)
+                self.stdout.write(self.style.WARNING(f"Skipped {audio_file.audio_file.name}: {str(e)}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Transcoded {converted} recordings; {unchanged} were already canonical."
+        ))
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{len(failed)} recordings could not be transcoded: {failed}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from record.task import expire_upload_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable upload sessions and their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Seconds since the last chunk (default: AUDIO_UPLOAD_SESSION_TTL)'
+        )
+
+    def handle(self, *args, **options):
+        count = expire_upload_sessions(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {count} upload sessions."))
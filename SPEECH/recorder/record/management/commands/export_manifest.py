@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from record.filters import filter_audio_files
+from record.manifest import MANIFEST_FORMATS, encode_manifest, manifest_rows
+from record.models import AudioFile
+
+
+class Command(BaseCommand):
+    help = 'Stream a training manifest (path, transcript, duration, labels, scores) as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=MANIFEST_FORMATS, default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help="Output file, or '-' for stdout")
+        parser.add_argument('--absolute-paths', action='store_true', help='Prefix paths with MEDIA_ROOT')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='FIELD=VALUE',
+            help='Filter rows, e.g. --filter is_verified=true --filter accent=british'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            params = dict(item.split('=', 1) for item in options['filter'])
+            queryset = filter_audio_files(AudioFile.objects.all(), params)
+        except ValueError as e:
+            raise CommandError(f"Invalid filter: {e}")
+
+        rows = manifest_rows(queryset, absolute_paths=options['absolute_paths'])
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            for line in encode_manifest(rows, options['format']):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if output is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f"Exported manifest to {options['output']}"))
@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from record.prompts import IMPORT_BATCH_SIZE, import_prompts, iter_prompts, make_spell_checker
+
+
+class Command(BaseCommand):
+    help = 'Bulk import text prompts from files or stdin, one per line (or one per word with --words)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', default=['-'], help="Input files; '-' reads stdin")
+        parser.add_argument('--words', action='store_true', help='Split lines into single-word prompts')
+        parser.add_argument('--lowercase', action='store_true')
+        parser.add_argument('--dictionary', default='en_US', help='Enchant dictionary used for spell checking')
+        parser.add_argument('--no-spellcheck', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def _lines(self, files):
+        for name in files:
+            if name == '-':
+                yield from sys.stdin
+                continue
+            try:
+                with open(name, encoding='utf-8', errors='replace') as f:
+                    yield from f
+            except OSError as e:
+                raise CommandError(f"Cannot read {name}: {e}")
+
+    def handle(self, *args, **options):
+        check = None
+        if not options['no_spellcheck']:
+            try:
+                check = make_spell_checker(options['dictionary'])
+            except Exception as e:
+                raise CommandError(f"Spell checker unavailable ({e}); install enchant or pass --no-spellcheck.")
+
+        summary = import_prompts(
+            iter_prompts(self._lines(options['files']), split_words=options['words']),
+            check=check,
+            lowercase=options['lowercase'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {summary['added']} prompts ({summary['duplicates']} duplicates skipped)."
+        ))
+        if summary['invalid']:
+            examples = ', '.join(summary['invalid_sample'])
+            self.stdout.write(self.style.WARNING(f"{summary['invalid']} invalid prompts not added, e.g.: {examples}"))
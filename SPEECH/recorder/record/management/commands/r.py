@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from record.models import TextPrompt
-import enchant  # PyEnchant library for English word validation
+from record.prompts import import_prompts, make_spell_checker
 
 class Command(BaseCommand):
     help = 'Populate the TextPrompt model with valid English words from a given text'
@@ -83,27 +82,12 @@ class Command(BaseCommand):
         *Subject to a maximum of 2 of this category of creative works per candidate. Candidate must tender the original letters of commissioning and acceptance (not
         """
 
-        # Initialize the English dictionary
-        d = enchant.Dict("en_US")
-
-        # Separate the text into words and deduplicate
-        word_list = text.split()
-        unique_words = set(word_list)  # Remove duplicates by converting to a set
-
-        # Add valid English words to the TextPrompt model
-        added_count = 0
-        invalid_words = []  # To store invalid words
-
-        for word in unique_words:
-            if d.check(word):  # Check if the word is valid in English
-                # Avoid attempting to add duplicates already in the database
-                if not TextPrompt.objects.filter(text=word).exists():
-                    TextPrompt.objects.create(text=word)
-                    added_count += 1
-            else:
-                invalid_words.append(word)  # Collect invalid words
+        # Spell-check, dedupe and insert the words in bulk
+        summary = import_prompts(text.split(), check=make_spell_checker("en_US"))
 
         # Output success message
-        self.stdout.write(self.style.SUCCESS(f"Added {added_count} valid English words to the database!"))
-        if invalid_words:
-            self.stdout.write(self.style.WARNING(f"Invalid words found (not added): {', '.join(invalid_words)}"))
+        self.stdout.write(self.style.SUCCESS(f"Added {summary['added']} valid English words to the database!"))
+        if summary['invalid']:
+            self.stdout.write(self.style.WARNING(
+                f"{summary['invalid']} invalid words found (not added), e.g.: {', '.join(summary['invalid_sample'])}"
+            ))
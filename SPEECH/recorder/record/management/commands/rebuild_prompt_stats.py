@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from record.stats import rebuild_prompt_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-prompt recording totals from the AudioFile table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_prompt_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt recording statistics for {count} prompts."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from record.audio import cached_metadata
+from record.batch import METADATA_FIELDS, apply_audio_metadata
+from record.feature_cache import get_feature_cache
+from record.models import AudioFile
+from record.stats import bulk_update_with_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute clip scores for processed recordings from the feature cache, without decoding audio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--requeue-missing', action='store_true',
+            help='Mark recordings without cached features as unprocessed so the next batch run decodes them'
+        )
+
+    def handle(self, *args, **options):
+        cache = get_feature_cache()
+        if cache is None:
+            self.stdout.write(self.style.ERROR("AUDIO_FEATURE_CACHE_DIR is not configured."))
+            return
+
+        queryset = (AudioFile.objects
+                    .filter(is_ml_processed=True)
+                    .only('id', 'checksum', *METADATA_FIELDS)
+                    .order_by('id'))
+        ids = list(queryset.values_list('pk', flat=True))
+
+        rescored = 0
+        missing = []
+        chunk_size = options['chunk_size']
+        for start in range(0, len(ids), chunk_size):
+            updated = []
+            for audio_file in queryset.filter(pk__in=ids[start:start + chunk_size]):
+                metadata = cached_metadata(audio_file.checksum)
+                if metadata is None:
+                    missing.append(audio_file.pk)
+                    continue
+                apply_audio_metadata(audio_file, metadata)
+                updated.append(audio_file)
+
+            bulk_update_with_stats(updated, METADATA_FIELDS)
+            rescored += len(updated)
+
+        if missing and options['requeue_missing']:
+            AudioFile.objects.filter(pk__in=missing).update(is_ml_processed=False)
+
+        self.stdout.write(self.style.SUCCESS(f"Rescored {rescored} recordings from the feature cache."))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{len(missing)} recordings had no cached features."))
@@ -0,0 +1,128 @@
+"""
+Media serving with HTTP Range, ETag and Last-Modified support.
+
+Replaces ``django.conf.urls.static`` (DEBUG-only, whole-file responses) so
+browser seeking and partial worker reads only transfer the bytes requested.
+Set MEDIA_SENDFILE to 'x-sendfile' or 'x-accel-redirect' to let the front-end
+server send the bytes instead of Python.
+"""
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range into ``(start, end)`` inclusive.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range, which is answered with the full file) and raises ValueError
+    when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    """A Range is only honoured when If-Range (if sent) still matches the file."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(mtime) <= modified
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file under MEDIA_ROOT with conditional and byte-range support."""
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    if not full_path.is_file():
+        raise Http404("File not found.")
+
+    stat = full_path.stat()
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+    # 304 Not Modified / 412 Precondition Failed
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        return conditional
+
+    content_type = mimetypes.guess_type(full_path.name)[0] or 'application/octet-stream'
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+
+    if sendfile:
+        # The front-end server reads the file and handles Range itself
+        response = HttpResponse(content_type=content_type)
+        if sendfile == 'x-accel-redirect':
+            prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            relative = full_path.relative_to(os.path.abspath(settings.MEDIA_ROOT)).as_posix()
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+        else:
+            response['X-Sendfile'] = str(full_path)
+    else:
+        try:
+            byte_range = _parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range and _if_range_matches(request, etag, stat.st_mtime):
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _iter_range(full_path, start, end - start + 1),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            # FileResponse lets the WSGI server use its own sendfile path
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f"max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 0)}, must-revalidate"
+    return response
@@ -0,0 +1,292 @@
+"""
+In-process metrics with a Prometheus text exposition endpoint.
+
+Counters and histograms live in a process-local registry. Process pool
+workers send their deltas back to the parent with each result. Other
+processes write snapshots to METRICS_DIR: django_q workers after each task,
+web processes from ``MetricsMiddleware`` at most every METRICS_FLUSH_INTERVAL
+seconds. Whichever process serves the scrape merges every snapshot into its
+own series, so with several web workers the request latencies of all of them
+are reported, at most one interval behind. Snapshots of processes that
+have exited (or, if set, that have not been written for
+METRICS_STALE_SECONDS) are deleted when the endpoint is scraped, and each
+file name carries a per-process token so a reused PID never inherits
+another process's history. Queue depth gauges are read from the database
+when the endpoint is scraped.
+"""
+import hmac
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# Distinguishes this process from an earlier one that had the same PID
+_PROCESS_TOKEN = f"{time.time_ns():x}"
+_flush_lock = threading.Lock()  # Request threads share one snapshot file
+_last_flush = 0.0  # time.monotonic() of this process's last snapshot write
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+
+# name -> (type, help)
+METRICS = {
+    'audio_stage_seconds': ('histogram', 'Time spent in each audio analysis stage'),
+    'audio_files_processed_total': ('counter', 'Audio files analyzed successfully'),
+    'audio_files_failed_total': ('counter', 'Audio files whose analysis failed'),
+    'audio_files_reused_total': ('counter', 'Audio files scored from an identical, already processed upload'),
+    'http_request_duration_seconds': ('histogram', 'Request latency per URL route'),
+    'audio_queue_depth': ('gauge', 'Work waiting to be processed'),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [bucket counts..., sum, count]
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            values = self.histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self):
+        """A JSON-serializable copy of every series."""
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def merge(self, snapshot, sign=1):
+        """Add (or with ``sign=-1`` subtract) a snapshot into this registry."""
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                key = _key(name, labels)
+                self.counters[key] = self.counters.get(key, 0) + sign * value
+            for name, labels, values in snapshot['histograms']:
+                current = self.histograms.setdefault(_key(name, labels), [0] * len(self.buckets) + [0.0, 0])
+                for index, value in enumerate(values):
+                    current[index] += sign * value
+
+
+REGISTRY = Registry()
+
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the ``with`` block in histogram ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - started, **labels)
+
+
+def stage(name):
+    """Shorthand for timing one audio analysis stage."""
+    return timed('audio_stage_seconds', stage=name)
+
+
+def delta_since(before):
+    """Series recorded since ``before`` (a snapshot), for shipping out of a pool worker."""
+    delta = Registry(REGISTRY.buckets)
+    delta.merge(REGISTRY.snapshot())
+    delta.merge(before, sign=-1)
+    return delta.snapshot()
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR so the endpoint can merge it."""
+    global _last_flush
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = _snapshot_name()
+    tmp_path = directory / f"{name}.tmp"
+    with _flush_lock:
+        with open(tmp_path, 'w') as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp_path, directory / name)
+        _last_flush = time.monotonic()
+
+
+def flush_if_due(interval):
+    """``flush()`` unless this process wrote its snapshot less than ``interval`` seconds ago."""
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def _snapshot_name():
+    return f"{os.getpid()}-{_PROCESS_TOKEN}.json"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Alive, but owned by another user
+        return True
+    return True
+
+
+def _is_stale(path, max_age):
+    """A snapshot whose process has exited or that has not been rewritten recently."""
+    try:
+        pid = int(path.name.split('-', 1)[0])
+    except ValueError:
+        return True
+    if pid != os.getpid() and not _pid_alive(pid):
+        return True
+    return max_age is not None and time.time() - path.stat().st_mtime > max_age
+
+
+def _collect():
+    """This process's series plus every other process's latest snapshot."""
+    registry = Registry(REGISTRY.buckets)
+    registry.merge(REGISTRY.snapshot())
+    directory = getattr(settings, 'METRICS_DIR', None)
+    max_age = getattr(settings, 'METRICS_STALE_SECONDS', None)
+    if directory and os.path.isdir(directory):
+        own = _snapshot_name()
+        for path in Path(directory).glob('*.json'):
+            if path.name == own:
+                continue
+            try:
+                if _is_stale(path, max_age):
+                    path.unlink(missing_ok=True)
+                    continue
+                with open(path) as f:
+                    registry.merge(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return registry
+
+
+def _queue_depths():
+    from django_q.models import OrmQ
+    from .models import AudioFile
+    return {
+        'django_q': OrmQ.objects.count(),
+        'unprocessed_audio': AudioFile.objects.filter(is_ml_processed=False).count(),
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def render():
+    """Render every series in the Prometheus text exposition format."""
+    registry = _collect()
+    series = {}
+    for (name, labels), value in sorted(registry.counters.items()):
+        series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), values in sorted(registry.histograms.items()):
+        lines = series.setdefault(name, [])
+        for bound, count in zip(registry.buckets, values):
+            bucket_labels = labels + (('le', _format_bound(bound)),)
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+    for queue, depth in _queue_depths().items():
+        series.setdefault('audio_queue_depth', []).append(f'audio_queue_depth{{queue="{queue}"}} {depth}')
+
+    output = []
+    for name, lines in series.items():
+        kind, help_text = METRICS.get(name, ('untyped', name))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return '\n'.join(output) + '\n'
+
+
+def _authorized(request):
+    """A bearer token matching METRICS_TOKEN, or a staff session when no token is set."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    if not _authorized(request):
+        return HttpResponseForbidden("Metrics require a valid bearer token or a staff login.")
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    Record the latency of every request, labelled by URL route, method and status.
+
+    The process's snapshot is also written to METRICS_DIR every
+    METRICS_FLUSH_INTERVAL seconds, so a scrape served by any web worker
+    includes the requests of all of them.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - started,
+            route=match.route if match else 'unmatched',
+            method=request.method,
+            status=str(response.status_code),
+        )
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 15)
+        if interval is not None:
+            try:
+                flush_if_due(interval)
+            except OSError as e:
+                logger.error(f"Could not write metrics snapshot: {str(e)}")
+        return response
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0006_alter_audiofile_options_audiofile_accent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 of the uploaded file contents', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(condition=models.Q(('is_ml_processed', False)), fields=['uploaded_at'], name='audiofile_pending_idx'),
+        ),
+    ]
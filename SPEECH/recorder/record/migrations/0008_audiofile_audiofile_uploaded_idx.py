@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0007_audiofile_checksum_audiofile_audiofile_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['uploaded_at', 'id'], name='audiofile_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0008_audiofile_audiofile_uploaded_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Speech duration in seconds after trimming silence', null=True),
+        ),
+    ]
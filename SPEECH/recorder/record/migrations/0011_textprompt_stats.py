@@ -0,0 +1,65 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:03
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_stats(apps, schema_editor):
+    # Self-contained on the historical models, so later changes to record.stats cannot break it
+    TextPrompt = apps.get_model('record', 'TextPrompt')
+    prompts = TextPrompt.objects.annotate(
+        n=Count('audio_files'),
+        n_verified=Count('audio_files', filter=Q(audio_files__is_verified=True)),
+        duration_sum=Sum('audio_files__duration', default=0.0),
+        clarity_total=Sum('audio_files__speech_clarity_score', default=0.0),
+        n_clarity=Count('audio_files__speech_clarity_score'),
+    )
+    updated = []
+    for prompt in prompts:
+        prompt.recording_count = prompt.n
+        prompt.verified_count = prompt.n_verified
+        prompt.total_duration = prompt.duration_sum
+        prompt.clarity_sum = prompt.clarity_total
+        prompt.clarity_count = prompt.n_clarity
+        updated.append(prompt)
+    TextPrompt.objects.bulk_update(
+        updated,
+        ['recording_count', 'verified_count', 'total_duration', 'clarity_sum', 'clarity_count'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textprompt',
+            name='clarity_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='textprompt',
+            name='clarity_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='textprompt',
+            name='recording_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='textprompt',
+            name='total_duration',
+            field=models.FloatField(default=0.0, help_text='Seconds of recorded audio'),
+        ),
+        migrations.AddField(
+            model_name='textprompt',
+            name='verified_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
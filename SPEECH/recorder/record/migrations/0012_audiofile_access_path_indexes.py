@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0011_textprompt_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['is_ml_processed', 'uploaded_at', 'id'], name='audiofile_processed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['is_verified', 'uploaded_at', 'id'], name='audiofile_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['gender', 'accent', 'age_group', 'quality'], name='audiofile_labels_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['speech_clarity_score', 'id'], name='audiofile_clarity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['background_noise_level', 'id'], name='audiofile_noise_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['duration', 'id'], name='audiofile_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(fields=['text_prompt', '-uploaded_at'], name='audiofile_prompt_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:40
+
+import django.core.validators
+import record.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0012_audiofile_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='original_file',
+            field=models.FileField(blank=True, help_text='The upload as received, kept when AUDIO_KEEP_ORIGINALS is set', null=True, upload_to=record.models.audio_file_path),
+        ),
+        migrations.AddField(
+            model_name='audiofile',
+            name='preview_file',
+            field=models.FileField(blank=True, help_text='Low-bitrate Opus copy for playback', null=True, upload_to=record.models.audio_file_path),
+        ),
+        migrations.AlterField(
+            model_name='audiofile',
+            name='audio_file',
+            field=models.FileField(help_text='Canonical 16 kHz mono FLAC once ingested (see record.ingest)', upload_to=record.models.audio_file_path, validators=[django.core.validators.FileExtensionValidator(['wav', 'mp3', 'ogg', 'webm', 'flac', 'opus'])]),
+        ),
+    ]
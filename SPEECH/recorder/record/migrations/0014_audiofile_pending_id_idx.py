@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0013_audiofile_original_preview'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiofile',
+            index=models.Index(condition=models.Q(('is_ml_processed', False)), fields=['id'], name='audiofile_pending_id_idx'),
+        ),
+    ]
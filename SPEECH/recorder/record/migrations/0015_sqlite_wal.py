@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:20
+
+from django.db import migrations
+
+
+def enable_wal(apps, schema_editor):
+    # journal_mode is stored in the database file, so it is set once here
+    # rather than on every connection (see DB_SQLITE_PRAGMAS)
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+
+def disable_wal(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=DELETE')
+
+
+class Migration(migrations.Migration):
+    # The journal mode cannot be changed inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('record', '0014_audiofile_pending_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_wal, disable_wal),
+    ]
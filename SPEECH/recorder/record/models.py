@@ -1,16 +1,56 @@
 import os
-from django.db import models
+import uuid
+import hashlib
+from django.db import models, transaction
 from django.core.validators import FileExtensionValidator
+from . import stats
 
 def audio_file_path(instance, filename):
     return os.path.join('recordings', str(instance.text_prompt.id), filename)
 
+def compute_checksum(file_obj, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file-like object's contents."""
+    digest = hashlib.sha256()
+    if hasattr(file_obj, 'chunks'):
+        chunks = file_obj.chunks(chunk_size)
+    else:
+        chunks = iter(lambda: file_obj.read(chunk_size), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
 class TextPrompt(models.Model):
     text = models.CharField(max_length=255, unique=True)
 
+    # Running totals over audio_files, maintained by record.stats
+    recording_count = models.PositiveIntegerField(default=0, db_index=True)
+    verified_count = models.PositiveIntegerField(default=0)
+    total_duration = models.FloatField(default=0.0, help_text="Seconds of recorded audio")
+    clarity_sum = models.FloatField(default=0.0)
+    clarity_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def mean_clarity(self):
+        return self.clarity_sum / self.clarity_count if self.clarity_count else None
+
     def __str__(self):
         return self.text
 
+def _recordings_deleted():
+    # A deleted recording can make its prompt least-recorded again
+    from .sampler import sampler  # record.sampler imports this module
+    sampler.invalidate()
+
+class AudioFileQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the rows, subtracting them from their prompts' totals with one grouped read."""
+        with transaction.atomic(using=self.db):
+            deltas = stats.deleted_deltas(self)
+            deleted = super().delete()
+            stats.apply_deltas(deltas)
+        _recordings_deleted()
+        return deleted
+
 class AudioFile(models.Model):
     # Machine Learning Relevant Fields
     QUALITY_CHOICES = [
@@ -50,7 +90,20 @@ class AudioFile(models.Model):
     )
     audio_file = models.FileField(
         upload_to=audio_file_path,
-        validators=[FileExtensionValidator(['wav', 'mp3', 'ogg'])]
+        validators=[FileExtensionValidator(['wav', 'mp3', 'ogg', 'webm', 'flac', 'opus'])],
+        help_text="Canonical 16 kHz mono FLAC once ingested (see record.ingest)"
+    )
+    original_file = models.FileField(
+        upload_to=audio_file_path,
+        null=True,
+        blank=True,
+        help_text="The upload as received, kept when AUDIO_KEEP_ORIGINALS is set"
+    )
+    preview_file = models.FileField(
+        upload_to=audio_file_path,
+        null=True,
+        blank=True,
+        help_text="Low-bitrate Opus copy for playback"
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
@@ -91,6 +144,11 @@ class AudioFile(models.Model):
         blank=True, 
         help_text="Speech clarity score (0-1)"
     )
+    duration = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Speech duration in seconds after trimming silence"
+    )
     recording_environment = models.CharField(
         max_length=50, 
         null=True, 
@@ -101,9 +159,96 @@ class AudioFile(models.Model):
     # Optional: Machine Learning Processing Flags
     is_verified = models.BooleanField(default=False)
     is_ml_processed = models.BooleanField(default=False)
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="SHA-256 of the uploaded file contents"
+    )
+
+    objects = AudioFileQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # Fingerprint new uploads so identical bytes are only analyzed once
+        if self._state.adding and not self.checksum and self.audio_file:
+            self.checksum = compute_checksum(self.audio_file)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & {*stats.SOURCE_FIELDS, 'text_prompt_id'}:
+            super().save(*args, **kwargs)
+            return
+
+        # Keep the prompt's running totals in step, in the same transaction
+        with transaction.atomic():
+            before = {} if self._state.adding else stats.snapshot([self.pk])
+            super().save(*args, **kwargs)
+            stats.apply_changes(before, stats.snapshot([self.pk]))
+
+    def delete(self, *args, **kwargs):
+        # Like the queryset delete: no delete signals, so bulk deletes stay fast
+        with transaction.atomic():
+            deltas = stats.deleted_deltas(AudioFile.objects.filter(pk=self.pk))
+            deleted = super().delete(*args, **kwargs)
+            stats.apply_deltas(deltas)
+        _recordings_deleted()
+        return deleted
 
     def __str__(self):
         return f"Audio for: {self.text_prompt.text} - {self.uploaded_at}"
 
     class Meta:
-        ordering = ['-uploaded_at']
\ No newline at end of file
+        ordering = ['-uploaded_at']
+        indexes = [
+            # Work queue: only rows still waiting for analysis are indexed
+            models.Index(
+                fields=['uploaded_at'],
+                name='audiofile_pending_idx',
+                condition=models.Q(is_ml_processed=False)
+            ),
+            # Unprocessed rows in primary-key order: keyset pagination of the audio_files API
+            models.Index(
+                fields=['id'],
+                name='audiofile_pending_id_idx',
+                condition=models.Q(is_ml_processed=False)
+            ),
+            # Upload-time ordering of the recordings list page
+            models.Index(fields=['uploaded_at', 'id'], name='audiofile_uploaded_idx'),
+            # Status filters combined with the list/API ordering
+            models.Index(fields=['is_ml_processed', 'uploaded_at', 'id'], name='audiofile_processed_idx'),
+            models.Index(fields=['is_verified', 'uploaded_at', 'id'], name='audiofile_verified_idx'),
+            # Label filters of the list page, API and manifest export
+            models.Index(fields=['gender', 'accent', 'age_group', 'quality'], name='audiofile_labels_idx'),
+            # Sort orders of the recordings list page
+            models.Index(fields=['speech_clarity_score', 'id'], name='audiofile_clarity_idx'),
+            models.Index(fields=['background_noise_level', 'id'], name='audiofile_noise_idx'),
+            models.Index(fields=['duration', 'id'], name='audiofile_duration_idx'),
+            # A prompt's recordings, newest first
+            models.Index(fields=['text_prompt', '-uploaded_at'], name='audiofile_prompt_uploaded_idx'),
+        ]
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload.
+
+    Chunks are written straight to ``file_name`` (the final storage path);
+    ``received`` is the number of bytes committed so far, which is where a
+    client resumes after a disconnect. ``updated_at`` moves with every chunk;
+    sessions idle past AUDIO_UPLOAD_SESSION_TTL are removed by
+    ``record.task.expire_upload_sessions``.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    text_prompt = models.ForeignKey(
+        TextPrompt,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions"
+    )
+    file_name = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id}: {self.received}/{self.total_size} bytes"
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class AudioFileCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key.
+
+    DRF builds the cursor from the first ordering field only (plus an offset
+    among rows sharing its value), so it must be unique: ``id`` is, and it
+    grows with upload time. Each page is a primary-key range scan from the
+    cursor position, so fetching page N costs the same as fetching the first.
+    """
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator whose total count is cached per query.
+
+    COUNT(*) over a large filtered table costs as much as a page of rows; the
+    count is shared across requests for PAGE_COUNT_CACHE_TIMEOUT seconds, so
+    only the first visitor of a filter combination pays for it.
+    """
+    @cached_property
+    def count(self):
+        try:
+            query = str(self.object_list.query)
+        except EmptyResultSet:
+            return 0
+        key = 'page_count:' + hashlib.sha256(query.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, getattr(settings, 'PAGE_COUNT_CACHE_TIMEOUT', 60))
+        return count
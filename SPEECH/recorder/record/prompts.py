@@ -0,0 +1,104 @@
+"""
+Bulk loading of TextPrompt rows.
+
+Prompts are streamed, normalized and deduplicated in memory, spell-checked
+through a memoized dictionary lookup, and inserted with batched
+``bulk_create(ignore_conflicts=True)``, so a large corpus costs one INSERT per
+batch instead of two queries per prompt.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from .models import TextPrompt
+from .sampler import sampler
+
+IMPORT_BATCH_SIZE = 5000
+INVALID_SAMPLE_SIZE = 20  # Rejected prompts returned as examples
+MAX_PROMPT_LENGTH = TextPrompt._meta.get_field('text').max_length
+
+WHITESPACE_RE = re.compile(r'\s+')
+# Punctuation that wraps a token in running text, e.g. "(word)," or "*Books"
+EDGE_PUNCTUATION = '.,;:!?"\'()[]{}*+'
+
+
+def normalize_prompt(text, lowercase=False):
+    """Canonical form of a prompt: NFC, single spaces, no wrapping punctuation."""
+    text = unicodedata.normalize('NFC', text)
+    text = WHITESPACE_RE.sub(' ', text).strip().strip(EDGE_PUNCTUATION).strip()
+    return text.lower() if lowercase else text
+
+
+def iter_prompts(lines, split_words=False):
+    """Yield raw prompts from an iterable of lines: one per line, or one per word."""
+    for line in lines:
+        if split_words:
+            yield from line.split()
+        else:
+            yield line
+
+
+def make_spell_checker(language='en_US', cache_size=1 << 18):
+    """
+    Return ``check(text)`` backed by an enchant dictionary.
+
+    Lookups are memoized per word, so repeated words in a large corpus hit the
+    C library once. A prompt passes when every word in it is valid.
+    """
+    import enchant  # PyEnchant; only needed when spell checking
+
+    dictionary = enchant.Dict(language)
+    check_word = lru_cache(maxsize=cache_size)(dictionary.check)
+
+    def check(text):
+        return all(check_word(word) for word in text.split())
+    check.cache_info = check_word.cache_info
+    return check
+
+
+def import_prompts(prompts, check=None, lowercase=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Insert new prompts in batches, skipping duplicates and invalid text.
+
+    ``prompts`` is any iterable of raw strings and ``check`` an optional
+    predicate (see ``make_spell_checker``). Returns a summary dict with the
+    number of prompts ``added``, the number of ``duplicates`` (repeated in
+    the input or already in the table), the number of ``invalid`` prompts and
+    up to INVALID_SAMPLE_SIZE of them as ``invalid_sample``.
+    """
+    seen = set()
+    invalid = 0
+    invalid_sample = []
+    batch = []
+    read = 0
+    before = TextPrompt.objects.count()
+
+    for raw in prompts:
+        text = normalize_prompt(raw, lowercase)
+        if not text:
+            continue
+        read += 1
+        if text in seen:
+            continue
+        seen.add(text)
+        if len(text) > MAX_PROMPT_LENGTH or (check is not None and not check(text)):
+            invalid += 1
+            if len(invalid_sample) < INVALID_SAMPLE_SIZE:
+                invalid_sample.append(text)
+            continue
+        batch.append(TextPrompt(text=text))
+        if len(batch) >= batch_size:
+            TextPrompt.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TextPrompt.objects.bulk_create(batch, ignore_conflicts=True)
+
+    # bulk_create sends no signals, so refresh the sampler's cached ids here
+    sampler.invalidate()
+    added = TextPrompt.objects.count() - before
+    return {
+        'added': added,
+        'duplicates': read - invalid - added,
+        'invalid': invalid,
+        'invalid_sample': invalid_sample,
+    }
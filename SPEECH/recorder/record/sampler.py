@@ -0,0 +1,101 @@
+"""
+Constant-time text prompt sampling for the recording page.
+
+Prompt ids are cached in process and the cache is dropped by the signals in
+``record.signals`` whenever prompts change (and refreshed after
+PROMPT_SAMPLER_TTL seconds, to pick up changes made by other processes), so a
+page view costs one primary-key lookup instead of loading every prompt.
+
+The 'balanced' strategy draws only from the prompts that have the fewest
+recordings. Each new recording removes its prompt from that pool in O(1);
+the pool is rebuilt from the indexed per-prompt recording_count when it runs
+dry, so every prompt gets recorded once before any is recorded twice.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Min
+
+from .models import TextPrompt
+
+STRATEGIES = ('uniform', 'balanced')
+
+
+class PromptSampler:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ids = None
+        self._ids_loaded_at = 0
+        self._lowest = None
+        self._positions = None
+        self._lowest_loaded_at = 0
+
+    def invalidate(self):
+        """Drop every cached id; the next draw reloads from the database."""
+        with self._lock:
+            self._ids = None
+            self._lowest = None
+            self._positions = None
+
+    def _fresh(self, loaded_at):
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _all_ids(self):
+        if self._ids is None or not self._fresh(self._ids_loaded_at):
+            self._ids = list(TextPrompt.objects.values_list('id', flat=True))
+            self._ids_loaded_at = time.monotonic()
+        return self._ids
+
+    def _lowest_ids(self):
+        if not self._lowest or not self._fresh(self._lowest_loaded_at):
+            # Both queries use the recording_count index maintained by record.stats
+            fewest = TextPrompt.objects.aggregate(fewest=Min('recording_count'))['fewest']
+            self._lowest = list(TextPrompt.objects.filter(recording_count=fewest).values_list('id', flat=True))
+            self._positions = {prompt_id: i for i, prompt_id in enumerate(self._lowest)}
+            self._lowest_loaded_at = time.monotonic()
+        return self._lowest
+
+    def record(self, prompt_id):
+        """A recording was added for ``prompt_id``: it no longer has the fewest."""
+        with self._lock:
+            if not self._positions or prompt_id not in self._positions:
+                return
+            # Swap with the last id and pop, keeping removal O(1)
+            index = self._positions.pop(prompt_id)
+            last = self._lowest.pop()
+            if last != prompt_id:
+                self._lowest[index] = last
+                self._positions[last] = index
+
+    def pick_id(self, strategy='uniform'):
+        """Return a random prompt id (None when there are no prompts)."""
+        with self._lock:
+            ids = self._lowest_ids() if strategy == 'balanced' else self._all_ids()
+            return random.choice(ids) if ids else None
+
+    def pick(self, strategy='uniform'):
+        """Return a random TextPrompt, or None when there are no prompts."""
+        for _ in range(2):
+            prompt_id = self.pick_id(strategy)
+            if prompt_id is None:
+                return None
+            prompt = TextPrompt.objects.filter(pk=prompt_id).first()
+            if prompt is not None:
+                return prompt
+            # Deleted by another process since the ids were cached
+            self.invalidate()
+        return None
+
+
+sampler = PromptSampler(ttl=getattr(settings, 'PROMPT_SAMPLER_TTL', 60))
+
+
+def sample_prompt():
+    """Pick a prompt using the configured PROMPT_SAMPLER_STRATEGY."""
+    strategy = getattr(settings, 'PROMPT_SAMPLER_STRATEGY', 'balanced')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown PROMPT_SAMPLER_STRATEGY: {strategy}")
+    return sampler.pick(strategy)
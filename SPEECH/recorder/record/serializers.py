@@ -24,5 +24,7 @@ class AudioFileSerializer(serializers.ModelSerializer):
             'speech_clarity_score',
             'recording_environment',
             'is_verified',
-            'is_ml_processed'
+            'is_ml_processed',
+            'checksum',
+            'preview_file'
         ]
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AudioFile, TextPrompt
+from .sampler import sampler
+
+
+@receiver(post_save, sender=TextPrompt)
+@receiver(post_delete, sender=TextPrompt)
+def invalidate_prompt_ids(sender, **kwargs):
+    """Keep the sampler's cached prompt ids in step with the table."""
+    sampler.invalidate()
+
+
+@receiver(post_save, sender=AudioFile)
+def track_prompt_coverage(sender, instance, created, **kwargs):
+    """Move a newly recorded prompt out of the sampler's least-recorded pool."""
+    if created:
+        sampler.record(instance.text_prompt_id)
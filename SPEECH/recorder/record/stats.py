@@ -0,0 +1,147 @@
+"""
+Denormalized per-prompt recording statistics.
+
+Each TextPrompt carries running totals of its recordings (count, verified
+count, total duration, clarity sum/count), so coverage pages and the prompt
+sampler read precomputed numbers instead of aggregating AudioFile rows.
+
+Totals are maintained as deltas: the contributing columns of the affected
+rows are read before and after a write, and the difference is applied in the
+same transaction with one ``UPDATE ... CASE`` per STATS_BATCH_SIZE prompts.
+Deletes subtract one grouped aggregate of the deleted rows. ``AudioFile.save()``,
+``AudioFile``/queryset deletes and the bulk update paths go through here; any
+other write to the contributing columns (e.g. ``QuerySet.update``) must call
+``rebuild_prompt_stats``.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+
+# AudioFile columns that feed the per-prompt totals
+SOURCE_FIELDS = ('text_prompt', 'is_verified', 'duration', 'speech_clarity_score')
+STAT_FIELDS = ('recording_count', 'verified_count', 'total_duration', 'clarity_sum', 'clarity_count')
+STATS_BATCH_SIZE = 500  # Prompts updated per UPDATE statement
+
+
+def _contribution(row):
+    """What one AudioFile row adds to its prompt's totals."""
+    clarity = row['speech_clarity_score']
+    return {
+        'recording_count': 1,
+        'verified_count': int(row['is_verified']),
+        'total_duration': row['duration'] or 0.0,
+        'clarity_sum': clarity or 0.0,
+        'clarity_count': int(clarity is not None),
+    }
+
+
+def snapshot(pks):
+    """Read the contributing columns of the given AudioFile rows, keyed by pk."""
+    AudioFile = apps.get_model('record', 'AudioFile')
+    rows = AudioFile.objects.filter(pk__in=list(pks)).values(
+        'pk', 'text_prompt_id', 'is_verified', 'duration', 'speech_clarity_score'
+    )
+    return {row['pk']: row for row in rows}
+
+
+def apply_changes(before, after):
+    """
+    Apply the difference between two snapshots to the prompt totals.
+
+    Rows only in ``before`` were deleted, rows only in ``after`` were
+    created, and rows in both may have changed prompt or values.
+    """
+    deltas = defaultdict(lambda: defaultdict(float))
+    for rows, sign in ((before, -1), (after, 1)):
+        for row in rows.values():
+            for field, value in _contribution(row).items():
+                deltas[row['text_prompt_id']][field] += sign * value
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """Add ``{prompt_id: {field: delta}}`` to the prompt totals, one UPDATE per STATS_BATCH_SIZE prompts."""
+    TextPrompt = apps.get_model('record', 'TextPrompt')
+    deltas = {
+        prompt_id: {field: value for field, value in delta.items() if value}
+        for prompt_id, delta in deltas.items()
+    }
+    prompt_ids = [prompt_id for prompt_id, delta in deltas.items() if delta]
+    for start in range(0, len(prompt_ids), STATS_BATCH_SIZE):
+        batch = prompt_ids[start:start + STATS_BATCH_SIZE]
+        updates = {}
+        for field in STAT_FIELDS:
+            is_count = field.endswith('_count')
+            whens = [
+                When(pk=prompt_id, then=Value(int(deltas[prompt_id][field]) if is_count else deltas[prompt_id][field]))
+                for prompt_id in batch if field in deltas[prompt_id]
+            ]
+            if whens:
+                output_field = IntegerField() if is_count else FloatField()
+                updates[field] = F(field) + Case(*whens, default=Value(0), output_field=output_field)
+        TextPrompt.objects.filter(pk__in=batch).update(**updates)
+
+
+def deleted_deltas(queryset):
+    """Deltas that remove the rows of an AudioFile queryset from their prompts, read in one grouped query."""
+    rows = queryset.order_by().values('text_prompt_id').annotate(
+        n=Count('pk'),
+        n_verified=Count('pk', filter=Q(is_verified=True)),
+        duration_sum=Sum('duration', default=0.0),
+        clarity_total=Sum('speech_clarity_score', default=0.0),
+        n_clarity=Count('speech_clarity_score'),
+    )
+    return {
+        row['text_prompt_id']: {
+            'recording_count': -row['n'],
+            'verified_count': -row['n_verified'],
+            'total_duration': -row['duration_sum'],
+            'clarity_sum': -row['clarity_total'],
+            'clarity_count': -row['n_clarity'],
+        }
+        for row in rows
+    }
+
+
+def bulk_update_with_stats(audio_files, fields, **kwargs):
+    """``AudioFile.objects.bulk_update`` that also applies the prompt deltas, atomically."""
+    AudioFile = apps.get_model('record', 'AudioFile')
+    audio_files = list(audio_files)
+    if not audio_files:
+        return 0
+    if not set(fields) & set(SOURCE_FIELDS):
+        with transaction.atomic():
+            return AudioFile.objects.bulk_update(audio_files, fields, **kwargs)
+
+    pks = [audio_file.pk for audio_file in audio_files]
+    with transaction.atomic():
+        before = snapshot(pks)
+        updated = AudioFile.objects.bulk_update(audio_files, fields, **kwargs)
+        apply_changes(before, snapshot(pks))
+    return updated
+
+
+def rebuild_prompt_stats(prompts=None):
+    """Recompute every prompt's totals from its AudioFile rows; returns the number of prompts."""
+    if prompts is None:
+        prompts = apps.get_model('record', 'TextPrompt').objects.all()
+    TextPrompt = prompts.model  # The historical model when called from a migration
+    prompts = prompts.annotate(
+        n=Count('audio_files'),
+        n_verified=Count('audio_files', filter=Q(audio_files__is_verified=True)),
+        duration_sum=Sum('audio_files__duration', default=0.0),
+        clarity_total=Sum('audio_files__speech_clarity_score', default=0.0),
+        n_clarity=Count('audio_files__speech_clarity_score'),
+    )
+    updated = []
+    for prompt in prompts:
+        prompt.recording_count = prompt.n
+        prompt.verified_count = prompt.n_verified
+        prompt.total_duration = prompt.duration_sum
+        prompt.clarity_sum = prompt.clarity_total
+        prompt.clarity_count = prompt.n_clarity
+        updated.append(prompt)
+    TextPrompt.objects.bulk_update(updated, STAT_FIELDS, batch_size=500)
+    return len(updated)
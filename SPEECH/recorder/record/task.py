@@ -1,32 +1,112 @@
 from django_q.tasks import async_task
-import librosa
-import os
+import threading
+from datetime import timedelta
 from django.conf import settings
-from .models import AudioFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from . import metrics
+from .audio import analyze_audio
+from .batch import METADATA_FIELDS, apply_audio_metadata, process_batch
+from .models import AudioFile, UploadSession
 
 def process_audio_file(audio_file_id):
     try:
         # Get the audio file instance
         audio_file = AudioFile.objects.get(id=audio_file_id)
-        audio_path = os.path.join(settings.MEDIA_ROOT, audio_file.audio_file.name)
+        if audio_file.is_ml_processed:
+            # A duplicate enqueue; the batch path skips these rows too
+            return f"Audio file {audio_file_id} is already processed."
 
-        # Load the audio file
-        y, sr = librosa.load(audio_path, sr=None)
+        # Decode once and extract metadata in memory
+        metadata = analyze_audio(audio_file.audio_file.path, audio_file.checksum)
 
-        # Extract metadata
-        rms = librosa.feature.rms(y=y)
-        avg_rms = float(rms.mean())  # Background noise level
-        hnr = librosa.effects.harmonic(y).mean()  # Speech clarity
-        recording_environment = 'quiet room' if avg_rms < 0.02 else 'noisy'
-
-        # Save metadata to the database
-        audio_file.background_noise_level = avg_rms
-        audio_file.speech_clarity_score = hnr
-        audio_file.recording_environment = recording_environment
-        audio_file.is_ml_processed = True
-        audio_file.save()
+        # Save metadata to the database (the same fields the batch path writes)
+        apply_audio_metadata(audio_file, metadata)
+        with metrics.stage('db_save'):
+            audio_file.save(update_fields=METADATA_FIELDS)
 
+        metrics.inc('audio_files_processed_total')
         return f"Audio file {audio_file_id} processed successfully."
 
     except Exception as e:
+        metrics.inc('audio_files_failed_total')
         return f"Error processing audio file {audio_file_id}: {str(e)}"
+
+    finally:
+        metrics.flush()
+
+
+def process_audio_batch(audio_file_ids):
+    """Analyze a group of pending uploads in one task and commit them in bulk."""
+    pending = (AudioFile.objects
+               .filter(pk__in=audio_file_ids, is_ml_processed=False)
+               .only('id', 'audio_file', 'checksum'))
+    # The cluster already runs tasks in parallel; analyze in-process here
+    return process_batch(pending, workers=1)
+
+
+# Upload ids waiting to be grouped into one batch task (batching mode only)
+_pending_ids = []
+_pending_timer = None
+_pending_lock = threading.Lock()
+
+
+def _flush_pending():
+    """Enqueue every buffered id as a single batch task."""
+    global _pending_timer
+    with _pending_lock:
+        ids = list(_pending_ids)
+        _pending_ids.clear()
+        if _pending_timer is not None:
+            _pending_timer.cancel()
+            _pending_timer = None
+    if ids:
+        async_task('record.task.process_audio_batch', ids)
+
+
+def enqueue_audio_processing(audio_file_id):
+    """
+    Schedule analysis of a freshly uploaded AudioFile.
+
+    With AUDIO_TASK_BATCH_SIZE <= 1 every upload gets its own task. Otherwise
+    ids are buffered and sent as one batch task once the batch is full or
+    AUDIO_TASK_BATCH_WAIT seconds have passed since the first buffered id.
+    Ids lost from the buffer (e.g. the web process exits) stay unprocessed and
+    are picked up by the process-audio endpoint.
+    """
+    global _pending_timer
+    batch_size = getattr(settings, 'AUDIO_TASK_BATCH_SIZE', 1)
+    if batch_size <= 1:
+        async_task('record.task.process_audio_file', audio_file_id)
+        return
+
+    with _pending_lock:
+        _pending_ids.append(audio_file_id)
+        batch_full = len(_pending_ids) >= batch_size
+        if not batch_full and _pending_timer is None:
+            _pending_timer = threading.Timer(getattr(settings, 'AUDIO_TASK_BATCH_WAIT', 5), _flush_pending)
+            _pending_timer.daemon = True
+            _pending_timer.start()
+
+    if batch_full:
+        _flush_pending()
+
+
+def expire_upload_sessions(max_age=None):
+    """
+    Delete upload sessions idle for more than ``max_age`` seconds
+    (default AUDIO_UPLOAD_SESSION_TTL), along with their partial files.
+
+    Run it from cron with the expire_upload_sessions command, or schedule
+    ``record.task.expire_upload_sessions`` with django_q.
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'AUDIO_UPLOAD_SESSION_TTL', 24 * 3600)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    expired = 0
+    for session in UploadSession.objects.filter(updated_at__lt=cutoff):
+        # Only remove the file if this process is the one deleting the row
+        if UploadSession.objects.filter(pk=session.pk, updated_at__lt=cutoff).delete()[0]:
+            default_storage.delete(session.file_name)
+            expired += 1
+    return expired
@@ -1,3 +1,817 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from unittest import mock
+from pathlib import Path
 
-# Create your tests here.
+import librosa
+import numpy as np
+import requests
+import soundfile as sf
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from worker_client import DownloadCache, MetadataUploader, UploadError, link_into, load_checkpoint
+
+from . import metrics
+from .audio import decode_bounded
+from .feature_cache import FeatureCache
+from .features import BlockEnergy, extract_features, frame_rms_batch, streamed_features, trim_bounds
+from .filters import filter_audio_files, sort_audio_files
+from .ingest import canonicalize, is_canonical
+from .media import _parse_range
+from .models import AudioFile, TextPrompt, UploadSession
+from .prompts import INVALID_SAMPLE_SIZE, import_prompts
+from .sampler import PromptSampler
+from .stats import bulk_update_with_stats
+
+TOLERANCE = 1e-8
+
+
+def speech_like(seed, n=30011, sr=16000):
+    """Noise bursts between a near-silent lead-in and a silent tail."""
+    rng = np.random.default_rng(seed)
+    y = rng.normal(0, 0.1, n).astype(np.float32)
+    y *= (np.sin(2 * np.pi * 4 * np.arange(n) / sr) > 0) * 0.9 + 0.1
+    y[:5000] *= 0.001
+    y[-7000:] = 0
+    return y
+
+
+class MediaRootTestCase(TestCase):
+    """Runs each test with an empty MEDIA_ROOT and no side-channel writes."""
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root,
+            AUDIO_FEATURE_CACHE_DIR=None,
+            METRICS_DIR=None,
+            AUDIO_CANONICALIZE=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class FilterTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompt_b = TextPrompt.objects.create(text='b')
+        self.prompt_a = TextPrompt.objects.create(text='a')
+        rows = [
+            (self.prompt_b, dict(gender='male', speech_clarity_score=0.9, duration=4.0, is_verified=True)),
+            (self.prompt_a, dict(gender='female', speech_clarity_score=0.2, duration=1.0)),
+            (self.prompt_b, dict(gender='female', speech_clarity_score=0.6, duration=2.0, is_ml_processed=True)),
+        ]
+        self.files = [
+            AudioFile.objects.create(text_prompt=prompt, audio_file=ContentFile(b'a', name='a.wav'), **fields)
+            for prompt, fields in rows
+        ]
+
+    def ids(self, queryset):
+        return [audio_file.id for audio_file in queryset]
+
+    def test_filter_audio_files(self):
+        queryset = AudioFile.objects.order_by('id')
+        first, second, third = self.files
+        self.assertEqual(self.ids(filter_audio_files(queryset, {'gender': 'female'})), [second.id, third.id])
+        self.assertEqual(self.ids(filter_audio_files(queryset, {'is_verified': 'true'})), [first.id])
+        self.assertEqual(self.ids(filter_audio_files(queryset, {'is_ml_processed': '0'})), [first.id, second.id])
+        self.assertEqual(
+            self.ids(filter_audio_files(queryset, {'min_clarity': '0.5', 'max_duration': '3'})), [third.id]
+        )
+        self.assertEqual(len(filter_audio_files(queryset, {})), 3)
+
+    def test_filter_audio_files_rejects_bad_values(self):
+        for params in ({'gender': 'robot'}, {'is_verified': 'maybe'}, {'min_clarity': 'high'}):
+            with self.assertRaises(ValueError):
+                filter_audio_files(AudioFile.objects.all(), params)
+
+    def test_sort_audio_files(self):
+        first, second, third = self.files
+        self.assertEqual(self.ids(sort_audio_files(AudioFile.objects.all(), 'clarity')), [second.id, third.id, first.id])
+        self.assertEqual(self.ids(sort_audio_files(AudioFile.objects.all(), '-duration')), [first.id, third.id, second.id])
+        # Ties on the prompt text fall back to id order
+        self.assertEqual(self.ids(sort_audio_files(AudioFile.objects.all(), 'prompt')), [second.id, first.id, third.id])
+        with self.assertRaises(ValueError):
+            sort_audio_files(AudioFile.objects.all(), 'size')
+
+
+class AudioFileListTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        prompt = TextPrompt.objects.create(text='hello')
+        self.files = [
+            AudioFile.objects.create(
+                text_prompt=prompt, audio_file=ContentFile(b'a', name='a.wav'), is_ml_processed=(i % 3 == 0)
+            )
+            for i in range(7)
+        ]
+
+    def test_cursor_pages_walk_unprocessed_files_in_id_order(self):
+        expected = [audio_file.id for audio_file in self.files if not audio_file.is_ml_processed]
+        seen = []
+        url = '/api/audio_files/?page_size=2'
+        while url:
+            response = self.api.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(seen, expected)
+
+    def test_rows_processed_between_pages_do_not_shift_the_next_page(self):
+        first = self.api.get('/api/audio_files/?page_size=2').json()
+        AudioFile.objects.filter(id=first['results'][0]['id']).update(is_ml_processed=True)
+        second = self.api.get(first['next']).json()
+        self.assertGreater(second['results'][0]['id'], first['results'][-1]['id'])
+
+    def test_invalid_filter(self):
+        self.assertEqual(self.api.get('/api/audio_files/?gender=robot').status_code, 400)
+
+
+class UpdateAudioMetadataTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.prompt = TextPrompt.objects.create(text='hello')
+        self.audio_file = AudioFile.objects.create(
+            text_prompt=self.prompt, audio_file=ContentFile(b'a', name='a.wav')
+        )
+
+    def post(self, records):
+        return self.api.post('/api/update_metadata/', records, format='json')
+
+    def test_per_record_statuses(self):
+        metadata = {"Speech Clarity Score": 0.7, "Background Noise Level": 0.01, "Duration (seconds)": 1.5}
+        response = self.post([
+            {"id": self.audio_file.id, "metadata": metadata},
+            {"id": 999999, "metadata": metadata},
+            {"id": "x", "metadata": metadata},
+            {"id": self.audio_file.id, "metadata": {"Duration (seconds)": "long"}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.json()['results']],
+            ['updated', 'not_found', 'invalid', 'invalid'],
+        )
+        self.audio_file.refresh_from_db()
+        self.assertTrue(self.audio_file.is_ml_processed)
+        self.assertEqual(self.audio_file.speech_clarity_score, 0.7)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.total_duration, 1.5)
+
+        response = self.post([{"id": self.audio_file.id, "metadata": metadata}])
+        self.assertEqual(response.json()['results'], [{"id": self.audio_file.id, "status": "unchanged"}])
+        self.assertEqual(response.json()['updated'], 0)
+
+    def test_rejects_non_list_payload(self):
+        self.assertEqual(self.post({"id": self.audio_file.id}).status_code, 400)
+
+
+class FrameRmsTests(TestCase):
+    def test_frame_rms_batch_matches_librosa(self):
+        clips = [speech_like(seed, n) for seed, n in ((0, 30011), (1, 4096), (2, 100))]
+        rms, valid = frame_rms_batch(clips)
+        for row, clip in enumerate(clips):
+            expected = librosa.feature.rms(y=clip, frame_length=2048, hop_length=512, center=True)[0]
+            np.testing.assert_allclose(rms[row, valid[row]], expected, rtol=0, atol=TOLERANCE)
+
+    def test_float64_clips(self):
+        clip = speech_like(4).astype(np.float64)
+        rms, valid = frame_rms_batch([clip])
+        np.testing.assert_allclose(rms[0, valid[0]], librosa.feature.rms(y=clip)[0], rtol=0, atol=TOLERANCE)
+
+
+class ResumableUploadTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.prompt = TextPrompt.objects.create(text='hello')
+        self.data = b'RIFF' + bytes(1000)
+
+    def start(self, **overrides):
+        payload = {'text_id': self.prompt.id, 'filename': 'take.wav', 'size': len(self.data), **overrides}
+        return self.api.post('/api/uploads/', payload, format='json')
+
+    def put(self, upload_id, offset, body):
+        return self.api.generic(
+            'PUT', f'/api/uploads/{upload_id}/', body,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_rejects_disallowed_extension(self):
+        response = self.start(filename='page.html')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_offset_mismatch(self):
+        upload_id = self.start().json()['upload_id']
+        self.assertEqual(self.put(upload_id, 0, self.data[:400]).json()['offset'], 400)
+
+        response = self.put(upload_id, 0, self.data[:400])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 400)
+
+    def test_oversize_chunk_reports_committed_offset(self):
+        upload_id = self.start().json()['upload_id']
+        response = self.put(upload_id, 0, self.data + bytes(70000))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], UploadSession.objects.get().received)
+
+    def test_incomplete_upload_is_not_finalized(self):
+        upload_id = self.start().json()['upload_id']
+        self.put(upload_id, 0, self.data[:400])
+
+        response = self.api.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 400)
+        self.assertFalse(AudioFile.objects.exists())
+
+    def test_complete_upload_creates_audio_file(self):
+        upload_id = self.start().json()['upload_id']
+        self.put(upload_id, 0, self.data[:400])
+        self.put(upload_id, 400, self.data[400:])
+
+        response = self.api.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 201)
+        audio_file = AudioFile.objects.get(id=response.json()['id'])
+        self.assertEqual(audio_file.text_prompt, self.prompt)
+        with audio_file.audio_file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_concurrent_completes_create_one_audio_file(self):
+        upload_id = self.start().json()['upload_id']
+        self.put(upload_id, 0, self.data)
+        session = UploadSession.objects.get()
+
+        self.assertEqual(self.api.post(f'/api/uploads/{upload_id}/complete/').status_code, 201)
+        # The second request read the session before the first one deleted it
+        with mock.patch('record.views.get_object_or_404', return_value=session):
+            response = self.api.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(AudioFile.objects.count(), 1)
+
+    def test_sessions_never_share_a_file(self):
+        first = UploadSession.objects.get(id=self.start().json()['upload_id'])
+        self.put(first.id, 0, self.data[:400])
+
+        real_get_available_name = default_storage.get_available_name
+        stale_names = iter([first.file_name])
+
+        def get_available_name(name, **kwargs):
+            # As if a concurrent request checked the name before the first session created it
+            return next(stale_names, None) or real_get_available_name(name, **kwargs)
+
+        with mock.patch.object(default_storage, 'get_available_name', get_available_name):
+            second = UploadSession.objects.get(id=self.start().json()['upload_id'])
+
+        self.assertNotEqual(second.file_name, first.file_name)
+        with default_storage.open(first.file_name, 'rb') as f:
+            self.assertEqual(f.read(), self.data[:400])
+
+
+class FakeResponse:
+    """The slice of ``requests.Response`` the worker helpers use."""
+    def __init__(self, status_code=200, body=b'', headers=None, json_data=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.json_data = json_data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def json(self):
+        return self.json_data
+
+
+class FakeMediaSession:
+    """Serves one file with an ETag, answering matching conditional GETs with 304."""
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, stream=False, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.body, {'ETag': self.etag})
+
+
+class FakeUploadSession:
+    """Accepts metadata POSTs, failing the first ``failures`` of them."""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def post(self, url, json=None):
+        if self.failures:
+            self.failures -= 1
+            raise requests.ConnectionError("server unavailable")
+        self.batches.append([record['id'] for record in json])
+        return FakeResponse(json_data={'results': [{'id': record['id'], 'status': 'updated'} for record in json]})
+
+
+@mock.patch('worker_client.time.sleep')
+class MetadataUploaderTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.checkpoint = self.root / 'uploaded_ids.txt'
+
+    def uploader(self, session, **kwargs):
+        return MetadataUploader(session, 'http://server/api/update_metadata/', self.checkpoint, **kwargs)
+
+    def test_acknowledged_ids_are_checkpointed(self, sleep):
+        session = FakeUploadSession()
+        uploader = self.uploader(session, batch_size=2)
+        for audio_id in (1, 2, 3):
+            uploader.add({'id': audio_id, 'metadata': {}})
+        self.assertEqual(session.batches, [[1, 2]])
+        self.assertEqual(load_checkpoint(self.checkpoint), {1, 2})
+
+        # A restarted worker skips what was acknowledged; the unsent record is redone
+        self.assertEqual(self.uploader(FakeUploadSession()).acknowledged, {1, 2})
+
+    def test_failed_batch_is_retried_with_backoff(self, sleep):
+        session = FakeUploadSession(failures=2)
+        uploader = self.uploader(session, batch_size=1)
+        uploader.add({'id': 1, 'metadata': {}})
+        uploader.add({'id': 2, 'metadata': {}})
+        self.assertEqual(session.batches, [])
+        uploader.add({'id': 3, 'metadata': {}})
+        self.assertEqual(session.batches, [[1, 2, 3]])
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+        self.assertEqual(uploader.failures, 0)
+
+    def test_gives_up_after_max_failures(self, sleep):
+        uploader = self.uploader(FakeUploadSession(failures=100), batch_size=2, max_failures=3)
+        uploader.add({'id': 1, 'metadata': {}})
+        uploader.add({'id': 2, 'metadata': {}})
+        uploader.add({'id': 3, 'metadata': {}})
+        with self.assertRaises(UploadError):
+            uploader.add({'id': 4, 'metadata': {}})
+        self.assertEqual(len(uploader.pending), 4)
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_close_uploads_the_rest_and_retires_the_checkpoint(self, sleep):
+        session = FakeUploadSession(failures=1)
+        uploader = self.uploader(session, batch_size=2)
+        uploader.add({'id': 1, 'metadata': {}})
+        uploader.add({'id': 2, 'metadata': {}})
+        uploader.add({'id': 3, 'metadata': {}})
+        uploader.close()
+        self.assertEqual(session.batches, [[1, 2, 3]])
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(self.uploader(FakeUploadSession()).acknowledged, set())
+
+    def test_close_keeps_the_checkpoint_when_the_upload_fails(self, sleep):
+        uploader = self.uploader(FakeUploadSession(), batch_size=1, max_failures=2)
+        uploader.add({'id': 1, 'metadata': {}})
+        uploader.session = FakeUploadSession(failures=100)
+        uploader.pending.append({'id': 2, 'metadata': {}})
+        with self.assertRaises(UploadError):
+            uploader.close()
+        self.assertEqual(load_checkpoint(self.checkpoint), {1})
+
+
+class DownloadCacheTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.cache = DownloadCache(self.root / 'cache')
+        self.audio = {'id': 7, 'audio_file': '/media/audio_files/hello/take.wav', 'checksum': 'abc'}
+
+    def test_unchanged_file_is_revalidated_not_downloaded(self):
+        session = FakeMediaSession(b'first', '"v1"')
+        object_path = self.cache.fetch(session, self.audio, 'http://server/take.wav')
+        self.assertEqual(object_path.read_bytes(), b'first')
+
+        self.assertEqual(self.cache.fetch(session, self.audio, 'http://server/take.wav'), object_path)
+        self.assertEqual(session.requests, [{}, {'If-None-Match': '"v1"'}])
+
+    def test_replaced_file_is_downloaded_again(self):
+        first = self.cache.fetch(FakeMediaSession(b'first', '"v1"'), self.audio, 'http://server/take.wav')
+        second = self.cache.fetch(FakeMediaSession(b'second', '"v2"'), self.audio, 'http://server/take.wav')
+        self.assertNotEqual(first, second)
+        self.assertEqual(second.read_bytes(), b'second')
+
+    def test_working_copy_is_independent_of_the_cache(self):
+        object_path = self.cache.fetch(FakeMediaSession(b'first', '"v1"'), self.audio, 'http://server/take.wav')
+        local_path = link_into(object_path, self.root / 'take.wav')
+        local_path.write_bytes(b'rewritten')
+        self.assertEqual(object_path.read_bytes(), b'first')
+
+
+class ParseRangeTests(TestCase):
+    def test_ranges(self):
+        self.assertEqual(_parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(_parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(_parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(_parse_range('bytes=-500', 100), (0, 99))
+        self.assertEqual(_parse_range('bytes=50-5000', 100), (50, 99))
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-6', 'items=0-9'):
+            self.assertIsNone(_parse_range(header, 100))
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=9-3'):
+            with self.assertRaises(ValueError):
+                _parse_range(header, 100)
+
+
+class ServeMediaTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        with open(f'{self.media_root}/clip.wav', 'wb') as f:
+            f.write(self.content)
+        self.url = '/media/clip.wav'
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # A stale validator gets the whole, current file instead of a range
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_missing_file(self):
+        self.assertEqual(self.client.get('/media/missing.wav').status_code, 404)
+
+
+class PromptSamplerTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompts = [TextPrompt.objects.create(text=text) for text in ('a', 'b', 'c', 'd')]
+        self.sampler = PromptSampler(ttl=60)
+
+    def record(self, prompt):
+        AudioFile.objects.create(text_prompt=prompt, audio_file=ContentFile(b'a', name='a.wav'))
+        self.sampler.record(prompt.id)
+
+    def assertPool(self, prompts):
+        pool = self.sampler._lowest
+        self.assertCountEqual(pool, [prompt.id for prompt in prompts])
+        self.assertEqual(self.sampler._positions, {prompt_id: i for i, prompt_id in enumerate(pool)})
+
+    def test_record_removes_prompt_from_pool(self):
+        a, b, c, d = self.prompts
+        self.sampler.pick_id('balanced')
+        self.sampler._lowest.sort()
+        self.sampler._positions = {prompt_id: i for i, prompt_id in enumerate(self.sampler._lowest)}
+        self.record(b)  # From the middle: the last id takes its slot
+        self.assertEqual(self.sampler._lowest, [a.id, d.id, c.id])
+        self.assertPool([a, c, d])
+        self.record(c)  # The last id: a plain pop
+        self.assertEqual(self.sampler._lowest, [a.id, d.id])
+        self.assertPool([a, d])
+        self.sampler.record(b.id)  # Not in the pool any more
+        self.assertPool([a, d])
+
+    def test_pool_is_rebuilt_when_every_prompt_is_covered(self):
+        a, b, c, d = self.prompts
+        self.sampler.pick_id('balanced')
+        self.record(a)
+        self.record(a)
+        for prompt in (b, c, d):
+            self.record(prompt)
+        self.assertEqual(self.sampler._lowest, [])
+
+        # Next draw rebuilds from recording_count: a has two recordings, the rest one
+        self.assertIn(self.sampler.pick_id('balanced'), [b.id, c.id, d.id])
+        self.assertPool([b, c, d])
+
+    def test_balanced_draws_cover_every_prompt_before_repeating(self):
+        drawn = []
+        for _ in self.prompts:
+            prompt = self.sampler.pick('balanced')
+            drawn.append(prompt.id)
+            self.record(prompt)
+        self.assertCountEqual(drawn, [prompt.id for prompt in self.prompts])
+
+    def test_no_prompts(self):
+        TextPrompt.objects.all().delete()
+        self.assertIsNone(PromptSampler().pick('balanced'))
+
+
+class PromptStatsTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompt = TextPrompt.objects.create(text='one')
+        self.other = TextPrompt.objects.create(text='two')
+
+    def create(self, prompt, name, **fields):
+        return AudioFile.objects.create(text_prompt=prompt, audio_file=ContentFile(name.encode(), name=name), **fields)
+
+    def assertStats(self, prompt, count, verified, duration, clarity_sum, clarity_count):
+        prompt.refresh_from_db()
+        self.assertEqual(
+            (prompt.recording_count, prompt.verified_count, prompt.clarity_count), (count, verified, clarity_count)
+        )
+        self.assertAlmostEqual(prompt.total_duration, duration)
+        self.assertAlmostEqual(prompt.clarity_sum, clarity_sum)
+
+    def test_save_updates_totals(self):
+        audio_file = self.create(self.prompt, 'a.wav', duration=2.0, speech_clarity_score=0.5)
+        self.create(self.prompt, 'b.wav', is_verified=True)
+        self.assertStats(self.prompt, 2, 1, 2.0, 0.5, 1)
+
+        audio_file.duration = 3.5
+        audio_file.save()
+        self.assertStats(self.prompt, 2, 1, 3.5, 0.5, 1)
+
+        audio_file.text_prompt = self.other
+        audio_file.save()
+        self.assertStats(self.prompt, 1, 1, 0.0, 0.0, 0)
+        self.assertStats(self.other, 1, 0, 3.5, 0.5, 1)
+
+    def test_delete_updates_totals(self):
+        audio_file = self.create(self.prompt, 'a.wav', duration=2.0, speech_clarity_score=0.5)
+        self.create(self.prompt, 'b.wav', duration=1.0)
+        audio_file.delete()
+        self.assertStats(self.prompt, 1, 0, 1.0, 0.0, 0)
+
+        AudioFile.objects.filter(text_prompt=self.prompt).delete()
+        self.assertStats(self.prompt, 0, 0, 0.0, 0.0, 0)
+
+    def test_bulk_update_with_stats(self):
+        first = self.create(self.prompt, 'a.wav')
+        second = self.create(self.prompt, 'b.wav', duration=1.0)
+        first.duration, first.speech_clarity_score, first.is_verified = 2.0, 0.8, True
+        second.text_prompt = self.other
+
+        bulk_update_with_stats([first, second], ['duration', 'speech_clarity_score', 'is_verified', 'text_prompt'])
+        self.assertStats(self.prompt, 1, 1, 2.0, 0.8, 1)
+        self.assertStats(self.other, 1, 0, 1.0, 0.0, 0)
+
+    def count_queries(self, n_prompts, write):
+        prompts = [TextPrompt.objects.create(text=f'{n_prompts}-{i}') for i in range(n_prompts)]
+        audio_files = [self.create(prompt, 'a.wav') for prompt in prompts]
+        with CaptureQueriesContext(connection) as queries:
+            write(audio_files)
+        return len(queries)
+
+    def test_bulk_update_query_count_does_not_grow_with_prompts(self):
+        def write(audio_files):
+            for audio_file in audio_files:
+                audio_file.duration = 1.0
+            bulk_update_with_stats(audio_files, ['duration'])
+
+        self.assertEqual(self.count_queries(2, write), self.count_queries(20, write))
+
+    def test_queryset_delete_query_count_does_not_grow_with_rows(self):
+        def write(audio_files):
+            AudioFile.objects.filter(pk__in=[audio_file.pk for audio_file in audio_files]).delete()
+
+        self.assertEqual(self.count_queries(2, write), self.count_queries(20, write))
+        emptied = TextPrompt.objects.exclude(pk__in=[self.prompt.pk, self.other.pk])
+        self.assertEqual(set(emptied.values_list('recording_count', flat=True)), {0})
+
+
+class ImportPromptsTests(TestCase):
+    def test_counts_duplicates_and_invalid_prompts(self):
+        TextPrompt.objects.create(text='already here')
+        lines = ['Hello  world', '(Hello world),', 'already here', 'x' * 300, '', 'second one']
+        summary = import_prompts(lines, batch_size=2)
+        self.assertEqual(summary, {'added': 2, 'duplicates': 2, 'invalid': 1, 'invalid_sample': ['x' * 300]})
+        self.assertCountEqual(
+            TextPrompt.objects.values_list('text', flat=True), ['already here', 'Hello world', 'second one']
+        )
+
+    def test_invalid_sample_is_bounded(self):
+        summary = import_prompts((f'bad {i}' for i in range(INVALID_SAMPLE_SIZE + 5)), check=lambda text: False)
+        self.assertEqual(summary['invalid'], INVALID_SAMPLE_SIZE + 5)
+        self.assertEqual(len(summary['invalid_sample']), INVALID_SAMPLE_SIZE)
+        self.assertEqual(summary['added'], 0)
+
+    def test_lowercase_folds_case_duplicates(self):
+        summary = import_prompts(['Word', 'word', 'WORD'], lowercase=True)
+        self.assertEqual((summary['added'], summary['duplicates']), (1, 2))
+
+
+class StreamedFeatureTests(TestCase):
+    def test_trim_bounds_matches_librosa(self):
+        for seed in range(3):
+            y = speech_like(seed)
+            energies = BlockEnergy()
+            for start in range(0, len(y), 1000):  # Blocks that do not line up with hops
+                energies.update(y[start:start + 1000])
+            _, (start, end) = librosa.effects.trim(y, top_db=30)
+            self.assertEqual(trim_bounds(energies.energies(), energies.n_samples, top_db=30), (start, end))
+
+    def test_streamed_features_match_in_memory_extraction(self):
+        y = speech_like(3)
+        energies = BlockEnergy()
+        energies.update(y)
+        table, envelope, length = streamed_features(energies.energies(), energies.n_samples, 16000, top_db=30)
+
+        trimmed, _ = librosa.effects.trim(y, top_db=30)
+        expected = extract_features([trimmed], 16000, return_envelopes=True)
+        self.assertEqual(length, len(trimmed))
+        for name in ('duration', 'rms', 'clarity', 'noise_floor'):
+            np.testing.assert_allclose(table[name], expected[name], rtol=0, atol=TOLERANCE)
+        np.testing.assert_allclose(
+            envelope, librosa.feature.rms(y=trimmed, center=True)[0], rtol=0, atol=TOLERANCE
+        )
+
+    def test_streamed_features_of_silence(self):
+        energies = BlockEnergy()
+        energies.update(np.zeros(0, dtype=np.float32))
+        self.assertEqual(streamed_features(energies.energies(), 0, 16000, top_db=30), (None, None, 0))
+
+
+class DecodeBoundedTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def noisy_corrupt_mp3(self, seconds=300):
+        """An MP3 with every 50th byte zeroed: ffmpeg logs well over a pipe buffer of errors."""
+        path = os.path.join(self.root, 'corrupt.mp3')
+        subprocess.run(
+            ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-f', 'lavfi',
+             '-i', f'sine=frequency=440:duration={seconds}:sample_rate=16000',
+             '-c:a', 'libmp3lame', '-b:a', '32k', path],
+            check=True
+        )
+        with open(path, 'r+b') as f:
+            data = bytearray(f.read())
+            data[::50] = bytes(len(data[::50]))
+            f.seek(0)
+            f.write(data)
+        return path
+
+    def test_noisy_decode_does_not_deadlock(self):
+        path = self.noisy_corrupt_mp3()
+        result = {}
+
+        def decode():
+            result['value'] = decode_bounded(path, 16000, max_samples=16000 * 60)
+
+        thread = threading.Thread(target=decode, daemon=True)
+        thread.start()
+        thread.join(timeout=60)
+        self.assertFalse(thread.is_alive(), "decode_bounded blocked on ffmpeg's stderr")
+        y, energies = result['value']
+        self.assertIsNone(y)
+        self.assertGreater(energies.n_samples, 16000 * 60)
+
+
+class CanonicalizeTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompt = TextPrompt.objects.create(text='hello')
+
+    def upload(self, name, sr=44100, channels=2):
+        path = os.path.join(self.media_root, name)
+        y = np.tile(speech_like(5, n=sr)[:, None], (1, channels))
+        sf.write(path, y, sr)
+        return AudioFile.objects.create(text_prompt=self.prompt, audio_file=name)
+
+    def test_repoints_and_deletes_the_original(self):
+        audio_file = self.upload('take.wav')
+        self.assertTrue(canonicalize(audio_file, keep_original=False, preview=False))
+
+        audio_file.refresh_from_db()
+        self.assertEqual(audio_file.audio_file.name, 'take.flac')
+        self.assertTrue(is_canonical(audio_file.audio_file.path))
+        self.assertFalse(audio_file.original_file)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'take.wav')))
+        self.assertAlmostEqual(sf.info(audio_file.audio_file.path).duration, 1.0, places=2)
+
+    def test_keeps_the_original_when_asked(self):
+        audio_file = self.upload('take.wav')
+        canonicalize(audio_file, keep_original=True, preview=False)
+
+        audio_file.refresh_from_db()
+        self.assertEqual((audio_file.audio_file.name, audio_file.original_file.name), ('take.flac', 'take.wav'))
+        self.assertTrue(os.path.exists(audio_file.original_file.path))
+
+    def test_canonical_upload_is_left_alone(self):
+        audio_file = self.upload('take.flac', sr=16000, channels=1)
+        self.assertFalse(canonicalize(audio_file, keep_original=False, preview=False))
+        self.assertEqual(AudioFile.objects.get().audio_file.name, 'take.flac')
+
+    def test_failed_transcode_keeps_the_row_on_the_original(self):
+        with open(os.path.join(self.media_root, 'broken.wav'), 'wb') as f:
+            f.write(b'not audio at all')
+        audio_file = AudioFile.objects.create(text_prompt=self.prompt, audio_file='broken.wav')
+        with self.assertRaises(subprocess.CalledProcessError):
+            canonicalize(audio_file, keep_original=False, preview=False)
+
+        self.assertEqual(AudioFile.objects.get().audio_file.name, 'broken.wav')
+        self.assertEqual(sorted(os.listdir(self.media_root)), ['broken.wav'])
+
+
+class MetricsFlushTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        overrides = override_settings(
+            METRICS_DIR=os.path.join(self.media_root, 'metrics'), METRICS_FLUSH_INTERVAL=3600
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.object(metrics, '_last_flush', 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flushed_requests(self):
+        with open(os.path.join(self.media_root, 'metrics', metrics._snapshot_name())) as f:
+            snapshot = json.load(f)
+        return sum(
+            values[-1] for name, labels, values in snapshot['histograms']
+            if name == 'http_request_duration_seconds' and labels['route'] == 'api/audio_files/'
+        )
+
+    def test_web_requests_are_flushed_on_an_interval(self):
+        self.client.get('/api/audio_files/')
+        flushed = self.flushed_requests()
+        self.assertGreater(flushed, 0)
+
+        self.client.get('/api/audio_files/')  # Within the interval: not written again
+        self.assertEqual(self.flushed_requests(), flushed)
+
+        with override_settings(METRICS_FLUSH_INTERVAL=0):
+            self.client.get('/api/audio_files/')
+        self.assertEqual(self.flushed_requests(), flushed + 2)
+
+
+class FeatureCacheTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.cache = FeatureCache(self.root, max_bytes=1 << 20)
+        self.envelope = np.arange(10, dtype=np.float32)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.cache.get('ab' * 32, 'rms'))
+        self.cache.put('ab' * 32, 'rms', self.envelope)
+        np.testing.assert_array_equal(self.cache.get('ab' * 32, 'rms'), self.envelope)
+
+    def test_entry_evicted_during_get_is_a_miss(self):
+        self.cache.put('ab' * 32, 'rms', self.envelope)
+        with mock.patch('record.feature_cache.os.utime', side_effect=FileNotFoundError):
+            self.assertIsNone(self.cache.get('ab' * 32, 'rms'))
+
+    def test_entry_evicted_during_put_is_skipped(self):
+        with mock.patch('record.feature_cache.tempfile.mkstemp', side_effect=FileNotFoundError):
+            self.cache.put('ab' * 32, 'rms', self.envelope)
+        self.assertIsNone(self.cache.get('ab' * 32, 'rms'))
+
+    def test_evict_drops_least_recently_used_entries(self):
+        self.cache.put('ab' * 32, 'rms', self.envelope)
+        self.cache.put('cd' * 32, 'rms', self.envelope)
+        os.utime(os.path.join(self.root, 'ab', 'ab' * 32), (0, 0))
+        self.cache.max_bytes = os.path.getsize(os.path.join(self.root, 'cd', 'cd' * 32, 'rms.npy'))
+
+        self.cache.evict()
+        self.assertIsNone(self.cache.get('ab' * 32, 'rms'))
+        self.assertIsNotNone(self.cache.get('cd' * 32, 'rms'))
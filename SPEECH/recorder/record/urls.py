@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import RecordAudioView, RecordListView, TextPromptAudioFilesView,process_audio_view,AudioFileListView,UpdateAudioMetadataView
+from .metrics import metrics_view
+from .views import RecordAudioView, RecordListView, TextPromptAudioFilesView,process_audio_view,AudioFileListView,UpdateAudioMetadataView,ManifestExportView,UploadSessionCreateView,UploadSessionView,UploadSessionCompleteView
 
 urlpatterns = [
     path('', RecordAudioView.as_view(), name='record_audio'),
@@ -10,5 +11,16 @@ urlpatterns = [
      path('api/audio_files/', AudioFileListView.as_view(), name='audio_files'),
 
     # Endpoint to update metadata
-    path('api/update_metadata/', UpdateAudioMetadataView.as_view(), name='update_metadata')
+    path('api/update_metadata/', UpdateAudioMetadataView.as_view(), name='update_metadata'),
+
+    # Streaming NDJSON/CSV training manifest
+    path('api/manifest/', ManifestExportView.as_view(), name='export_manifest'),
+
+    # Resumable chunked uploads: init, PUT chunks with Upload-Offset, complete
+    path('api/uploads/', UploadSessionCreateView.as_view(), name='upload_create'),
+    path('api/uploads/<uuid:upload_id>/', UploadSessionView.as_view(), name='upload_session'),
+    path('api/uploads/<uuid:upload_id>/complete/', UploadSessionCompleteView.as_view(), name='upload_complete'),
+
+    # Prometheus text metrics: stage timings, request latency, counters, queue depth
+    path('metrics/', metrics_view, name='metrics'),
 ]
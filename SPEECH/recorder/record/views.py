@@ -2,16 +2,26 @@ from django.views import View
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
 from .models import TextPrompt, AudioFile
-import random
+from .task import enqueue_audio_processing
+from .sampler import sample_prompt
+from .ingest import ingest_upload
 import logging
 
 logger = logging.getLogger(__name__)
 
+def schedule_analysis(audio_file_id):
+    """Enqueue analysis without letting a broker failure break the upload."""
+    try:
+        enqueue_audio_processing(audio_file_id)
+    except Exception as e:
+        logger.error(f"Error enqueuing analysis for audio file {audio_file_id}: {str(e)}")
+
 class RecordAudioView(View):
     def get(self, request, *args, **kwargs):
-        """Handle GET requests: select a random text prompt"""
-        text_prompt = random.choice(TextPrompt.objects.all()) if TextPrompt.objects.exists() else None
+        """Handle GET requests: select a text prompt (favouring the least recorded)"""
+        text_prompt = sample_prompt()
 
         if not text_prompt:
             messages.error(request, "No text prompts available.")
@@ -51,6 +61,10 @@ class RecordAudioView(View):
             # Save the instance to the database
             audio_file_instance.save()
 
+            # Store the canonical format, then score the clip in the background
+            ingest_upload(audio_file_instance)
+            transaction.on_commit(lambda: schedule_analysis(audio_file_instance.id))
+
             messages.success(request, "Audio file uploaded successfully!")
         
         except Exception as e:
@@ -62,159 +76,127 @@ class RecordAudioView(View):
 
 from django.views.generic import ListView
 from .models import AudioFile
+from .filters import CHOICE_FILTERS, SORT_FIELDS, filter_audio_files, sort_audio_files
+from .pagination import CachedCountPaginator
 
 class RecordListView(ListView):
+    """
+    Paginated recordings list with the audio_files API filters plus
+    ``?sort=`` on the ML metadata columns.
+    """
     model = AudioFile
     template_name = 'list.html'
     context_object_name = 'audio_files'  # The context object will be accessible as `audio_files` in the template
+    paginate_by = 50
+    paginator_class = CachedCountPaginator
+    default_sort = '-uploaded'
 
-    # You can customize the queryset if necessary
     def get_queryset(self):
-        return AudioFile.objects.all()
+        # One join for the prompt text instead of a query per row
+        queryset = AudioFile.objects.select_related('text_prompt')
+        self.filter_error = None
+        try:
+            queryset = filter_audio_files(queryset, self.request.GET)
+            return sort_audio_files(queryset, self.request.GET.get('sort') or self.default_sort)
+        except ValueError as e:
+            self.filter_error = str(e)
+            return queryset.none()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Filters without the page number, for building pagination links
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context.update({
+            'filter_error': self.filter_error,
+            'filters': self.request.GET,
+            'query_string': params.urlencode(),
+            'sort': self.request.GET.get('sort') or self.default_sort,
+            'sort_fields': SORT_FIELDS,
+            'choice_filters': [
+                (name, choices, self.request.GET.get(name, '')) for name, choices in CHOICE_FILTERS.items()
+            ],
+        })
+        return context
 
 from django.views import View
 from django.shortcuts import render
+from django.core.paginator import Paginator
 from .models import TextPrompt
 
 class TextPromptAudioFilesView(View):
     def get(self, request, text_id, *args, **kwargs):
         try:
             text_prompt = TextPrompt.objects.get(id=text_id)
-            audio_files = text_prompt.audio_files.all()  # Access related audio files
         except TextPrompt.DoesNotExist:
             messages.error(request, "Text prompt not found.")
             return redirect('home')
 
+        # Totals come from the prompt's counters; only one page of rows is loaded
+        paginator = Paginator(text_prompt.audio_files.only('id', 'audio_file', 'uploaded_at'), 50)
+        paginator.count = text_prompt.recording_count
+        page = paginator.get_page(request.GET.get('page'))
+
         return render(request, 'text_prompt_audio_files.html', {
             'text_prompt': text_prompt,
-            'audio_files': audio_files,
+            'audio_files': page,
+            'page': page,
         })
 from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-import os
-import librosa
-import soundfile as sf
-import subprocess
-from pathlib import Path
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.db import transaction
 from record.models import AudioFile  # Replace with your actual app model
+from .audio import analyze_audio
+from .batch import METADATA_FIELDS, apply_audio_metadata, process_batch
 
 def process_audio_view(request):
     """
-    View to process audio files by converting to WAV, trimming silence,
-    and extracting metadata.
+    View to process audio files in parallel: each file is decoded once,
+    trimmed and analyzed in a process pool, and results are committed in bulk.
+
+    Optional query parameters: ``workers`` (pool size) and ``chunk_size``.
     """
     try:
-        # Get all unprocessed audio files
-        unprocessed_files = AudioFile.objects.all()
+        workers = int(request.GET['workers']) if 'workers' in request.GET else None
+        chunk_size = int(request.GET['chunk_size']) if 'chunk_size' in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "workers and chunk_size must be integers."}, status=400)
+
+    try:
+        # Get all unprocessed audio files (served by the partial pending index)
+        unprocessed_files = (AudioFile.objects
+                             .filter(is_ml_processed=False)
+                             .only('id', 'audio_file', 'checksum')
+                             .order_by('uploaded_at'))
 
         if not unprocessed_files.exists():
             return JsonResponse({"message": "No unprocessed audio files found."}, status=200)
 
-        # Process each audio file
-        for audio_file in unprocessed_files:
-            with transaction.atomic():
-                process_audio_file(audio_file)
+        summary = process_batch(unprocessed_files, workers=workers, chunk_size=chunk_size)
 
-        return JsonResponse({"message": "Audio files processed successfully."}, status=200)
+        return JsonResponse({"message": "Audio files processed successfully.", **summary}, status=200)
 
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 def process_audio_file(audio_file):
-    """Processes a single audio file: convert to WAV, trim silence, and extract metadata."""
+    """Processes a single audio file: decode once in memory, trim silence, and extract metadata."""
     try:
-        # Use absolute paths and ensure directory exists
-        original_path = Path(audio_file.audio_file.path).resolve()
-        media_root = Path(settings.MEDIA_ROOT)  # Import settings at the top of your file
-        
-        # Ensure the directory exists for converted and trimmed files
-        converted_dir = original_path.parent
-        converted_path = converted_dir / f"{original_path.stem}.wav"
-        
-        # Convert to WAV (if needed)
-        if original_path.suffix.lower() != '.wav':
-            convert_to_wav(original_path, converted_path)
-            
-            # Update file path relative to MEDIA_ROOT
-            relative_path = converted_path.relative_to(media_root)
-            audio_file.audio_file.name = str(relative_path)
-            audio_file.save(update_fields=['audio_file'])
-
-        # Trim silence
-        trimmed_path = trim_silence(converted_path)
-
-        # Process the trimmed WAV file
-        extract_audio_metadata(audio_file, trimmed_path)
-
-        # Clean up intermediate files 
-        if converted_path.exists():
-            converted_path.unlink()
-        if trimmed_path.exists():
-            trimmed_path.unlink()
-
-    except Exception as e:
-        logger.error(f"Error processing {audio_file.audio_file.name}: {str(e)}")
-        raise
-
-
-def convert_to_wav(input_path, output_path):
-    """Convert any input audio format to WAV using ffmpeg."""
-    try:
-        # Ensure output directory exists
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-
-        subprocess.run([
-            'ffmpeg', 
-            '-i', str(input_path),  # Convert Path to string
-            '-acodec', 'pcm_s16le', 
-            '-ar', '44100', 
-            '-ac', '1', 
-            str(output_path)  # Convert Path to string
-        ], check=True, stderr=subprocess.PIPE)
-
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr.decode() if e.stderr else str(e)
-        logger.error(f"FFmpeg conversion error for {input_path}: {error_message}")
-        raise
-
-def trim_silence(wav_path):
-    """Trim silence from the start and end of a WAV file using librosa."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-        y_trimmed, _ = librosa.effects.trim(y, top_db=30)  # Adjust top_db as needed
-        trimmed_path = wav_path.with_stem(wav_path.stem + '_trimmed')
-        sf.write(trimmed_path, y_trimmed, sr)  # Save trimmed audio
-        return trimmed_path
-    except Exception as e:
-        raise Exception(f"Error trimming silence from {wav_path}: {str(e)}")
-
-
-def extract_audio_metadata(audio_file, wav_path):
-    """Extracts audio metadata and updates the database."""
-    try:
-        y, sr = librosa.load(wav_path, sr=None)
-
-        # Example metadata extraction
-        duration = librosa.get_duration(y=y, sr=sr)
-        rms = librosa.feature.rms(y=y).mean()
-        clarity_score = min(max(rms / 0.1, 0), 1)  # Normalize clarity score
-        noise_level = librosa.feature.rms(y=y[y < 0.01]).mean()
+        metadata = analyze_audio(audio_file.audio_file.path, audio_file.checksum)
 
         # Update metadata fields
-        audio_file.speech_clarity_score = round(clarity_score, 2)
-        audio_file.background_noise_level = round(noise_level, 2)
-        audio_file.is_ml_processed = True
-        audio_file.save()
+        apply_audio_metadata(audio_file, metadata)
+        audio_file.save(update_fields=METADATA_FIELDS)
 
     except Exception as e:
-        raise Exception(f"Error extracting metadata from {wav_path}: {str(e)}")
+        logger.error(f"Error processing {audio_file.audio_file.name}: {str(e)}")
+        raise
 
 
 from rest_framework.views import APIView
@@ -228,43 +210,268 @@ logger = logging.getLogger(__name__)
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from .models import AudioFile
 from .serializers import AudioFileSerializer
+from .filters import filter_audio_files, parse_bool
+from .pagination import AudioFileCursorPagination
 
-class AudioFileListView(APIView):
+class AudioFileListView(generics.ListAPIView):
     """
-    API View to retrieve all unprocessed audio files along with their metadata.
+    API View to retrieve unprocessed audio files along with their metadata.
+
+    Results are cursor-paginated on id (upload order) and can be filtered by
+    ``is_ml_processed``, ``is_verified``, ``accent`` and ``gender``. Without an
+    ``is_ml_processed`` filter only unprocessed files are listed, unless
+    ``?include_processed=true`` is passed.
     """
-    def get(self, request, *args, **kwargs):
-        # Retrieve all AudioFile objects
-        unprocessed_files = AudioFile.objects.all()
+    serializer_class = AudioFileSerializer
+    pagination_class = AudioFileCursorPagination
 
-        # Serialize the audio files along with their associated metadata
-        serializer = AudioFileSerializer(unprocessed_files, many=True)
-        
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        params = self.request.query_params
+        # Fetch prompts in the same query instead of one query per row
+        queryset = AudioFile.objects.select_related('text_prompt')
 
+        try:
+            if 'is_ml_processed' not in params and not parse_bool(params.get('include_processed', 'false')):
+                queryset = queryset.filter(is_ml_processed=False)
+            return filter_audio_files(queryset, params)
+        except ValueError as e:
+            raise ValidationError({"error": str(e)})
+
+
+# Worker metadata keys and the AudioFile columns they update
+METADATA_KEY_MAP = {
+    "Speech Clarity Score": "speech_clarity_score",
+    "Background Noise Level": "background_noise_level",
+    "Duration (seconds)": "duration",
+}
+
+from .stats import bulk_update_with_stats
 
 class UpdateAudioMetadataView(APIView):
     """
     API View to receive metadata updates and save them to the database.
+
+    The whole payload is fetched with one ``in_bulk`` query and written with
+    one ``bulk_update`` of only the changed columns, inside a single
+    transaction. The response reports a status for every record.
     """
     def post(self, request, *args, **kwargs):
         data = request.data
-        try:
-            for record in data:
-                audio_id = record.get("id")
-                metadata = record.get("metadata", {})
-                
-                audio_file = AudioFile.objects.get(id=audio_id)
-                audio_file.speech_clarity_score = metadata.get("Speech Clarity Score", 0)
-                audio_file.background_noise_level = metadata.get("Background Noise Level", 0)
-                audio_file.is_ml_processed = True
-                audio_file.save()
-
-            return Response({"message": "Metadata updated successfully."}, status=status.HTTP_200_OK)
+        if not isinstance(data, list):
+            return Response({"error": "Expected a list of metadata records."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = [record.get("id") for record in data if isinstance(record, dict)]
+        audio_files = AudioFile.objects.only('id', 'is_ml_processed', *METADATA_KEY_MAP.values()).in_bulk(
+            [audio_id for audio_id in ids if isinstance(audio_id, int)]
+        )
+
+        results = []
+        changed = {}
+        changed_fields = set()
+        for record in data:
+            audio_id = record.get("id") if isinstance(record, dict) else None
+            audio_file = audio_files.get(audio_id) if isinstance(audio_id, int) else None
+            if audio_file is None:
+                results.append({"id": audio_id, "status": "not_found" if isinstance(audio_id, int) else "invalid"})
+                continue
+
+            try:
+                metadata = record.get("metadata") or {}
+                values = {field: float(metadata[key]) for key, field in METADATA_KEY_MAP.items() if key in metadata}
+            except (AttributeError, TypeError, ValueError) as e:
+                results.append({"id": audio_id, "status": "invalid", "error": str(e)})
+                continue
+            values['is_ml_processed'] = True
+
+            fields = [field for field, value in values.items() if getattr(audio_file, field) != value]
+            for field in fields:
+                setattr(audio_file, field, values[field])
+            if fields:
+                changed[audio_id] = audio_file
+                changed_fields.update(fields)
+            results.append({"id": audio_id, "status": "updated" if fields else "unchanged"})
 
+        try:
+            if changed:
+                bulk_update_with_stats(changed.values(), sorted(changed_fields), batch_size=500)
         except Exception as e:
             logger.error(f"Error updating metadata: {str(e)}")
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "message": "Metadata updated successfully.",
+            "updated": len(changed),
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+
+from django.http import StreamingHttpResponse
+from .manifest import MANIFEST_FORMATS, encode_manifest, manifest_rows
+
+class ManifestExportView(View):
+    """
+    Stream a dataset manifest as NDJSON (default) or CSV via ``?format=csv``.
+
+    Accepts the same filters as the audio_files API; rows are encoded as
+    they are read, so the first bytes go out immediately.
+    """
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'ndjson')
+        if fmt not in MANIFEST_FORMATS:
+            return JsonResponse({"error": f"Unsupported format: {fmt}"}, status=400)
+
+        try:
+            queryset = filter_audio_files(AudioFile.objects.all(), request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        response = StreamingHttpResponse(
+            encode_manifest(manifest_rows(queryset), fmt),
+            content_type=self.content_types[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="manifest.{fmt}"'
+        return response
+
+
+import os
+from django.core.exceptions import ValidationError as FileValidationError
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from .models import UploadSession, audio_file_path
+
+class UploadSessionCreateView(APIView):
+    """
+    Start a resumable upload: ``{"text_id", "filename", "size"}``.
+
+    The final storage path is reserved immediately and every chunk is
+    appended to it, so finalizing never copies the recording.
+    """
+    def post(self, request, *args, **kwargs):
+        text_id = request.data.get('text_id')
+        filename = get_valid_filename(os.path.basename(str(request.data.get('filename') or 'recording.wav')))
+        max_size = getattr(settings, 'AUDIO_UPLOAD_MAX_BYTES', 200 * 1024 * 1024)
+
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({"error": "size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < size <= max_size:
+            return Response({"error": f"size must be between 1 and {max_size} bytes."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Apply AudioFile's extension check now, before anything is written under MEDIA_ROOT
+        try:
+            for validator in AudioFile._meta.get_field('audio_file').validators:
+                validator(File(None, name=filename))
+        except FileValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            text_prompt = TextPrompt.objects.get(id=text_id)
+        except (TextPrompt.DoesNotExist, ValueError):
+            return Response({"error": "Invalid text prompt."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Reserve a unique final path by creating it empty; O_EXCL fails instead of
+        # truncating if a concurrent session was handed the same name
+        name = audio_file_path(AudioFile(text_prompt=text_prompt), filename)
+        while True:
+            name = default_storage.get_available_name(name)
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666))
+                break
+            except FileExistsError:
+                continue
+
+        session = UploadSession.objects.create(text_prompt=text_prompt, file_name=name, total_size=size)
+        return Response({
+            "upload_id": str(session.id),
+            "offset": 0,
+            "chunk_size": getattr(settings, 'AUDIO_UPLOAD_CHUNK_SIZE', 1024 * 1024),
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    """
+    ``GET`` reports the committed offset to resume from; ``PUT`` appends the
+    request body at the offset given in the ``Upload-Offset`` header.
+    """
+    read_size = 64 * 1024
+
+    def get(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(UploadSession, id=upload_id)
+        return Response({"offset": session.received, "size": session.total_size})
+
+    def put(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(UploadSession, id=upload_id)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if offset != session.received:
+            # Client is out of sync (e.g. a lost response); tell it where to resume
+            return Response({"error": "Offset mismatch.", "offset": session.received}, status=status.HTTP_409_CONFLICT)
+
+        written = 0
+        stream = request.stream
+        try:
+            with open(default_storage.path(session.file_name), 'r+b') as f:
+                f.seek(offset)
+                while stream is not None:
+                    data = stream.read(self.read_size)
+                    if not data:
+                        break
+                    if offset + written + len(data) > session.total_size:
+                        # Bytes before this read were written; the finally below commits them
+                        return Response({"error": "Chunk exceeds the declared upload size.",
+                                         "offset": offset + written},
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    f.write(data)
+                    written += len(data)
+        except OSError as e:
+            # A dropped connection keeps whatever arrived; the client resumes from there
+            logger.error(f"Error receiving chunk for upload {upload_id}: {str(e)}")
+        finally:
+            # Only advance if nobody else moved the offset meanwhile
+            UploadSession.objects.filter(id=session.id, received=offset).update(
+                received=offset + written, updated_at=timezone.now()
+            )
+
+        return Response({"offset": offset + written, "size": session.total_size})
+
+
+class UploadSessionCompleteView(APIView):
+    """Finalize a fully received upload into an AudioFile and enqueue its analysis."""
+    def post(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(UploadSession, id=upload_id)
+        if session.received != session.total_size:
+            return Response({"error": "Upload is incomplete.", "offset": session.received},
+                            status=status.HTTP_409_CONFLICT)
+
+        with transaction.atomic():
+            # Claim the session first: of two concurrent completes only one deletes it
+            if not UploadSession.objects.filter(id=session.id, received=session.total_size).delete()[0]:
+                return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+            audio_file = AudioFile(text_prompt_id=session.text_prompt_id)
+            audio_file.audio_file.name = session.file_name
+            audio_file.save()
+
+        # Transcode outside the transaction so ffmpeg never holds the write lock,
+        # and only analyze once the row points at its canonical file
+        ingest_upload(audio_file)
+        schedule_analysis(audio_file.id)
+
+        return Response({"id": audio_file.id}, status=status.HTTP_201_CREATED)
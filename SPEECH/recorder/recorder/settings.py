@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -33,6 +34,7 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '192.168.1.110']
 INSTALLED_APPS = [
     'record',
     'rest_framework',
+    'django_q',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -42,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'record.metrics.MetricsMiddleware',  # First, so it times the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +78,54 @@ WSGI_APPLICATION = 'recorder.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DB_ENGINE=postgresql switches to PostgreSQL (configured by the DB_* variables
+# below); otherwise SQLite runs in WAL mode so uploads and worker writes can
+# proceed while pages are read, with writers waiting on a busy timeout instead
+# of failing with "database is locked". WAL is persistent, so it is switched on
+# once by migration record.0015_sqlite_wal; the PRAGMAs below are per connection.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))  # Seconds a connection is reused; 0 closes per request
+DB_SQLITE_TIMEOUT = int(os.environ.get('DB_SQLITE_TIMEOUT', 20))  # Seconds a writer waits for the lock
+DB_SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',  # Durable at every checkpoint; safe with WAL
+    'cache_size': -20000,  # 20 MB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
 }
 
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'recorder'),
+            'USER': os.environ.get('DB_USER', 'recorder'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # DB_POOL=1 uses psycopg 3's connection pool instead of persistent connections
+            'OPTIONS': {'pool': True} if os.environ.get('DB_POOL') == '1' else {},
+        }
+    }
+    if os.environ.get('DB_POOL') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # Required by the pool
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'timeout': DB_SQLITE_TIMEOUT,
+                # Take the write lock when a transaction starts, so concurrent
+                # writers queue on the timeout instead of deadlocking on upgrade
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in DB_SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -138,3 +182,50 @@ Q_CLUSTER = {
     'retry': 60,  # Retry failed tasks after 60 seconds
     'orm': 'default',  # Use Django ORM as the broker
 }
+
+# Batch audio processing (process-audio/ endpoint)
+AUDIO_BATCH_WORKERS = None  # Process pool size; None uses every available core
+AUDIO_BATCH_CHUNK_SIZE = 200  # Files analyzed and committed per bulk_update
+
+# Analysis on upload (django_q)
+AUDIO_TASK_BATCH_SIZE = 1  # >1 groups that many uploads into one process_audio_batch task
+AUDIO_TASK_BATCH_WAIT = 5  # Seconds a partial batch waits before it is enqueued anyway
+
+# Frame-level feature cache keyed by audio checksum (set the dir to None to disable)
+AUDIO_FEATURE_CACHE_DIR = os.path.join(BASE_DIR, 'feature_cache')
+AUDIO_FEATURE_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted past this
+AUDIO_FEATURE_CACHE_LOGMEL = False  # Also cache an 80-band log-mel spectrogram per clip
+
+# Resumable chunked uploads
+AUDIO_UPLOAD_CHUNK_SIZE = 1024 * 1024  # Chunk size suggested to clients
+AUDIO_UPLOAD_MAX_BYTES = 200 * 1024 * 1024
+AUDIO_UPLOAD_SESSION_TTL = 24 * 3600  # Seconds without a chunk before expire_upload_sessions removes a session
+
+# Media serving (record.media.serve_media)
+MEDIA_SENDFILE = None  # 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx) to offload file bodies
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'  # nginx internal location aliased to MEDIA_ROOT
+MEDIA_CACHE_MAX_AGE = 3600  # Seconds clients may reuse a file before revalidating its ETag
+
+# Text prompt sampling on the recording page (record.sampler)
+PROMPT_SAMPLER_STRATEGY = 'balanced'  # 'balanced' favours prompts with the fewest recordings; 'uniform' picks any
+PROMPT_SAMPLER_TTL = 60  # Seconds cached prompt ids are trusted before reloading (other processes' changes)
+
+# Recordings list page
+PAGE_COUNT_CACHE_TIMEOUT = 60  # Seconds a filtered list's total count is reused across requests
+
+# Metrics (record.metrics, scraped at /metrics/)
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')  # Where worker processes publish their metrics; None keeps them per-process
+METRICS_FLUSH_INTERVAL = 15  # Seconds between snapshot writes of each web process; None leaves /metrics/ with only the serving process's requests
+METRICS_STALE_SECONDS = None  # Also drop snapshots not rewritten for this long (e.g. METRICS_DIR shared across hosts)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Scrapers send 'Authorization: Bearer <token>'; unset allows staff sessions only
+
+# Recordings longer than this are analyzed block by block instead of in memory (None disables streaming)
+AUDIO_STREAMING_MAX_SECONDS = 600
+
+# Canonical storage at ingest (record.ingest): uploads are transcoded to 16 kHz mono FLAC
+AUDIO_CANONICALIZE = True
+AUDIO_KEEP_ORIGINALS = False  # Keep the upload as received in AudioFile.original_file
+AUDIO_PREVIEWS = False  # Also write a 24 kbit/s Opus preview for playback
+
+# Every clip is resampled to this rate once, while ffmpeg decodes it, before trimming and features
+AUDIO_ANALYSIS_SAMPLE_RATE = 16000
@@ -0,0 +1,391 @@
+"""
+Helpers shared by the pas.py / process_audio.py workers.
+
+All requests go through one pooled keep-alive session, and audio downloads run
+concurrently on a thread pool with large buffered writes, so a worker catching
+up on a backlog is bound by bandwidth rather than per-file round trips.
+Downloads go through a content-addressed local cache, so unchanged clips are
+never transferred twice. Downloaded clips are analyzed by streaming them in
+blocks through the NumPy-only extractor in ``record.features``.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import requests
+import soundfile as sf
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared NumPy-only feature extractor from the Django app
+from record.features import BlockEnergy, streamed_features, trim_bounds
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 8))  # Concurrent transfers
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read and written per call
+DOWNLOAD_CACHE_DIR = os.environ.get("DOWNLOAD_CACHE_DIR", "download_cache")
+
+
+def create_session(pool_size=DOWNLOAD_WORKERS):
+    """Create a keep-alive session whose connection pool fits every download thread."""
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def absolute_url(url, server_url):
+    """Prefix relative media URLs with the server address."""
+    if url.startswith(("http://", "https://")):
+        return url
+    return f"{server_url}{url}" if url.startswith("/") else f"{server_url}/{url}"
+
+
+def fetch_all_pages(session, url):
+    """Yield every result of a cursor-paginated endpoint, page by page."""
+    while url:
+        response = session.get(url)
+        response.raise_for_status()
+        page = response.json()
+        yield from page["results"]
+        url = page["next"]
+
+
+def local_audio_path(audio, output_dir):
+    """Local file name for a server record; the id keeps shared basenames apart."""
+    return Path(output_dir) / f"{audio['id']}_{os.path.basename(audio['audio_file'])}"
+
+
+class DownloadCache:
+    """
+    Content-addressed local cache of downloaded audio.
+
+    Files live once under ``objects/<sha256[:2]>/<sha256><ext>``, keyed by the
+    hash of the bytes actually served; a small per-id index entry records that
+    hash, the server's checksum, and the ETag and Last-Modified seen for each
+    server record. Every fetch is a conditional GET (If-None-Match /
+    If-Modified-Since), so unchanged files come back as 304 Not Modified and
+    a file the server has since replaced is downloaded again.
+    """
+    def __init__(self, root=DOWNLOAD_CACHE_DIR):
+        self.root = Path(root)
+        (self.root / "index").mkdir(parents=True, exist_ok=True)
+
+    def _index_path(self, audio_id):
+        return self.root / "index" / f"{audio_id}.json"
+
+    def _object_path(self, checksum, suffix):
+        return self.root / "objects" / checksum[:2] / f"{checksum}{suffix}"
+
+    def _load_entry(self, audio_id):
+        try:
+            with open(self._index_path(audio_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_entry(self, audio_id, entry):
+        tmp_path = self._index_path(audio_id).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._index_path(audio_id))
+
+    def fetch(self, session, audio, url, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Return the cached object path for ``audio``, downloading only when it changed."""
+        suffix = Path(audio["audio_file"]).suffix
+        entry = self._load_entry(audio["id"])
+        cached = Path(entry["object"]) if entry.get("object") else None
+        headers = {}
+        if cached and cached.exists():
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with session.get(url, stream=True, headers=headers) as response:
+            if response.status_code == 304 and cached and cached.exists():
+                return cached
+            response.raise_for_status()
+
+            # Hash while streaming, then file the object under its checksum
+            digest = hashlib.sha256()
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+            with os.fdopen(fd, "wb", buffering=chunk_size) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    digest.update(chunk)
+                    f.write(chunk)
+            object_path = self._object_path(digest.hexdigest(), suffix)
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, object_path)
+            os.chmod(object_path, 0o444)  # Published objects are immutable
+
+            self._save_entry(audio["id"], {
+                "object": str(object_path),
+                "checksum": digest.hexdigest(),
+                # Fingerprints the original upload, not the canonical file served (record.ingest)
+                "server_checksum": audio.get("checksum"),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            })
+        return object_path
+
+
+FICLONE = 0x40049409  # Linux ioctl: copy-on-write clone (btrfs, XFS, ...)
+
+
+def _clone_or_copy(source, destination):
+    """Copy a file, sharing its blocks copy-on-write where the filesystem allows."""
+    try:
+        import fcntl
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(source, destination)
+
+
+def link_into(object_path, local_path):
+    """
+    Expose a cached object at ``local_path`` as an independent file.
+
+    Working files are renamed and rewritten by the workers, so they are
+    reflinked or copied rather than hard-linked: a later in-place write
+    must never reach the shared cache object.
+    """
+    tmp_path = local_path.with_name(local_path.name + ".part")
+    _clone_or_copy(object_path, tmp_path)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, local_path)
+    return local_path
+
+
+def download_audio_files(session, audio_files, output_dir, server_url, workers=DOWNLOAD_WORKERS):
+    """
+    Download many audio files concurrently through the local download cache.
+
+    Yields ``(audio, local_path)`` as each transfer finishes; ``local_path`` is
+    None when the download failed. At most ``2 * workers`` transfers are
+    queued ahead of the consumer, so a slow consumer pauses the downloads.
+    """
+    def download(audio):
+        url = absolute_url(audio["audio_file"], server_url)
+        try:
+            object_path = cache.fetch(session, audio, url)
+            local_path = link_into(object_path, local_audio_path(audio, output_dir))
+            logger.info(f"Downloaded file: {local_path}")
+            return local_path
+        except (requests.RequestException, OSError) as e:
+            # Network or local disk failure (full disk, failed copy or rename): skip this clip only
+            logger.error(f"Failed to download file {url}: {e}")
+            return None
+
+    cache = DownloadCache()
+    audio_files = iter(audio_files)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        while True:
+            for audio in islice(audio_files, 2 * workers - len(futures)):
+                futures[executor.submit(download, audio)] = audio
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+
+
+UPLOAD_BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", 100))  # Records per metadata POST
+UPLOAD_MAX_FAILURES = int(os.environ.get("UPLOAD_MAX_FAILURES", 5))  # Consecutive failed POSTs before giving up
+UPLOAD_BACKOFF_MAX = 60  # Seconds; the wait after a failed POST doubles up to this
+
+
+class UploadError(RuntimeError):
+    """The server kept rejecting metadata uploads."""
+
+
+def load_checkpoint(checkpoint_path):
+    """Return the set of server ids already acknowledged in a checkpoint file."""
+    try:
+        with open(checkpoint_path) as f:
+            return {int(line) for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+class MetadataUploader:
+    """
+    Post metadata records in batches as they complete.
+
+    Ids acknowledged by the server are appended to a checkpoint file, so a
+    restarted worker skips them and redoes only unacknowledged clips. The
+    checkpoint belongs to one run: ``close`` removes it once the run has
+    completed, so rows re-queued on the server later are analyzed again. A failed
+    POST is retried on the next ``add`` after an exponential backoff, and
+    after ``max_failures`` consecutive failures ``UploadError`` is raised, so
+    at most ``batch_size + max_failures`` records are ever held in memory.
+    """
+    def __init__(self, session, url, checkpoint_path, batch_size=UPLOAD_BATCH_SIZE,
+                 max_failures=UPLOAD_MAX_FAILURES):
+        self.session = session
+        self.url = url
+        self.checkpoint_path = Path(checkpoint_path)
+        self.batch_size = batch_size
+        self.max_failures = max_failures
+        self.failures = 0
+        self.acknowledged = load_checkpoint(self.checkpoint_path)
+        self.pending = []
+
+    def add(self, record):
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Send the pending records; on failure they are kept for the next flush.
+
+        Raises ``UploadError`` once ``max_failures`` flushes in a row have failed.
+        """
+        if not self.pending:
+            return True
+        try:
+            response = self.session.post(self.url, json=self.pending)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.failures += 1
+            logger.error(f"Error uploading metadata batch of {len(self.pending)} "
+                         f"(attempt {self.failures} of {self.max_failures}): {e}")
+            if self.failures >= self.max_failures:
+                raise UploadError(f"Metadata upload failed {self.failures} times in a row") from e
+            time.sleep(min(2 ** (self.failures - 1), UPLOAD_BACKOFF_MAX))
+            return False
+
+        self.failures = 0
+
+        for result in response.json().get("results", []):
+            if result.get("status") not in ("updated", "unchanged"):
+                logger.warning(f"Server rejected metadata for {result.get('id')}: {result}")
+
+        ids = [record["id"] for record in self.pending]
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.checkpoint_path, "a") as f:
+            f.writelines(f"{audio_id}\n" for audio_id in ids)
+            f.flush()
+            os.fsync(f.fileno())
+        self.acknowledged.update(ids)
+        logger.info(f"Uploaded metadata for {len(ids)} files.")
+        self.pending = []
+        return True
+
+    def close(self):
+        """
+        Upload everything still pending, then retire the checkpoint.
+
+        Call only when the run has completed; raises ``UploadError`` (keeping
+        the checkpoint) if the remaining records cannot be uploaded.
+        """
+        while not self.flush():
+            pass
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.acknowledged = set()
+
+
+ANALYSIS_SAMPLE_RATE = int(os.environ.get("ANALYSIS_SAMPLE_RATE", 16000))  # Keep equal to the server's AUDIO_ANALYSIS_SAMPLE_RATE
+
+
+def convert_to_wav(input_path):
+    """Resample to mono at ANALYSIS_SAMPLE_RATE with ffmpeg, file to file, so it is never held in memory."""
+    if input_path.suffix.lower() in ('.wav', '.flac'):
+        info = sf.info(str(input_path))
+        if info.samplerate == ANALYSIS_SAMPLE_RATE and info.channels == 1:
+            # Canonical uploads are 16 kHz mono FLAC, which soundfile reads directly
+            return input_path
+    output_path = input_path.with_name(input_path.stem + '_analysis.wav')
+    subprocess.run(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', str(input_path),
+         '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE), str(output_path)],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    return output_path
+
+
+STREAM_BLOCK_FRAMES = 1 << 16  # Frames read per block; memory does not grow with clip length
+
+
+def read_blocks(wav_path):
+    """Yield mono float32 blocks of a sound file without loading it whole."""
+    for block in sf.blocks(str(wav_path), blocksize=STREAM_BLOCK_FRAMES, dtype='float32', always_2d=True):
+        yield block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+
+
+def block_energies(wav_path):
+    """Per-hop sums of squares of a sound file, read block by block."""
+    energies = BlockEnergy()
+    for block in read_blocks(wav_path):
+        energies.update(block)
+    return energies
+
+
+def trim_silence(wav_path):
+    """Trim silence from the start and end of a WAV file, streaming it in blocks."""
+    try:
+        energies = block_energies(wav_path)
+        start, end = trim_bounds(energies.energies(), energies.n_samples, top_db=30)
+        trimmed_path = wav_path.with_name(wav_path.stem + '_trimmed.wav')
+        info = sf.info(str(wav_path))
+        with sf.SoundFile(str(trimmed_path), 'w', samplerate=info.samplerate, channels=1) as out:
+            position = 0
+            for block in read_blocks(wav_path):
+                # Copy only the part of each block inside [start, end)
+                lo, hi = max(start - position, 0), min(end - position, len(block))
+                if lo < hi:
+                    out.write(block[lo:hi])
+                position += len(block)
+        return trimmed_path
+    except Exception as e:
+        logger.error(f"Error trimming silence from {wav_path}: {e}")
+        return wav_path
+
+
+def extract_audio_metadata(wav_path):
+    """Extract metadata from the WAV file, streaming it in blocks."""
+    try:
+        energies = block_energies(wav_path)
+        sr = sf.info(str(wav_path)).samplerate
+        features, _, _ = streamed_features(energies.energies(), energies.n_samples, sr, top_db=None)
+        rms = float(features["rms"][0])
+
+        return {
+            "Duration (seconds)": round(float(features["duration"][0]), 2),
+            "RMS (Root Mean Square Energy)": round(rms, 4),
+            "Speech Clarity Score": round(float(features["clarity"][0]), 2),
+            "Background Noise Level": round(float(features["noise_floor"][0]), 4),
+        }
+    except Exception as e:
+        logger.error(f"Error extracting metadata from {wav_path}: {e}")
+        return {}
+
+
+def process_audio(file_path):
+    """Process the audio file to convert, trim, and extract metadata."""
+    try:
+        file_path = Path(file_path).resolve()
+        wav_path = convert_to_wav(file_path)
+        trimmed_path = trim_silence(wav_path)
+        metadata = extract_audio_metadata(trimmed_path)
+        return metadata
+    except Exception as e:
+        logger.error(f"Error processing file {file_path}: {e}")
+        return {}